@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+########## CONST ##########
+# How long the first request of a batch waits for others to join it.
+PARSE_BATCH_WINDOW = float(os.getenv("PARSE_BATCH_WINDOW_MS", "5")) / 1000
+PARSE_BATCH_MAX = int(os.getenv("PARSE_BATCH_MAX", "16"))
+# "prompt": one multi-task completion per batch; "concurrent": one completion
+# per task, all sent at once over the shared client's connection pool.
+PARSE_BATCH_MODE = os.getenv("PARSE_BATCH_MODE", "prompt")
+
+
+class ParseBatcher:
+    """
+    Collects concurrent task parses into batches.
+
+    Requests that arrive within `window` seconds of each other (up to
+    `max_batch`) are parsed together; identical tasks in a batch share one
+    result. A batch of several tasks goes to `parse_many` as one request in
+    "prompt" mode, and any task it can't answer falls back to `parse_one`.
+
+    Parameters:
+    - parse_one: Coroutine function `parse_one(task) -> dict`.
+    - parse_many: Coroutine function `parse_many(tasks) -> list`, with None
+      for each task it couldn't parse. Results are handed out by position, so
+      it must return None for any answer it can't tie to its task.
+    """
+
+    def __init__(
+        self,
+        parse_one,
+        parse_many=None,
+        window=PARSE_BATCH_WINDOW,
+        max_batch=PARSE_BATCH_MAX,
+        mode=PARSE_BATCH_MODE,
+    ):
+        self.parse_one = parse_one
+        self.parse_many = parse_many
+        self.window = window
+        self.max_batch = max_batch
+        self.mode = mode
+        self._pending = []
+        self._timer = None
+        self._dispatching = set()
+        self.stats = {"requests": 0, "batches": 0, "llm_calls": 0, "fallbacks": 0}
+
+    async def parse(self, task: str):
+        """Parses a task as part of the next batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((task, future))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            dispatch = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._dispatching.add(dispatch)
+            dispatch.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: list):
+        waiters = {}
+        for task, future in batch:
+            waiters.setdefault(task, []).append(future)
+        tasks = list(waiters)
+        self.stats["batches"] += 1
+
+        try:
+            results = await self._parse_tasks(tasks)
+        except Exception as e:
+            results = [{"error": f"An error occurred: {str(e)}"}] * len(tasks)
+
+        for task, result in zip(tasks, results):
+            for future in waiters[task]:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _parse_tasks(self, tasks: list):
+        if len(tasks) == 1 or self.mode != "prompt" or self.parse_many is None:
+            self.stats["llm_calls"] += len(tasks)
+            return await asyncio.gather(*(self.parse_one(task) for task in tasks))
+
+        self.stats["llm_calls"] += 1
+        results = list(await self.parse_many(tasks))
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            self.stats["fallbacks"] += len(missing)
+            self.stats["llm_calls"] += len(missing)
+            retried = await asyncio.gather(*(self.parse_one(tasks[i]) for i in missing))
+            for i, result in zip(missing, retried):
+                results[i] = result
+        return results
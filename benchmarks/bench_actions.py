@@ -0,0 +1,243 @@
+# Usage: python benchmarks/bench_actions.py [--scales 1 10] [--repeat 3]
+#                                           [--action NAME ...] [--latency-ms 50]
+#                                           [--root DIR] [--output FILE]
+#
+# Times every `phase_A` task function on datasets generated by `datagen.py`
+# at each scale, with LLM and embedding calls answered by the local fake
+# OpenAI server. Memoized actions run with force=True, so each repeat does
+# the real work; their memo-hit latency is reported separately. Before each
+# cold run the format, OCR, embedding, log-index and Markdown-manifest
+# caches are pointed at an empty directory (and format.md is restored), so
+# "median" is a cold run; "warm" is the median of as many reruns on the
+# filled caches. The first call is reported apart, since it includes imports.
+#
+# Results are printed and saved as JSON under benchmarks/results/ (see
+# results.py to compare two runs). Actions that can't run here (e.g. no
+# tesseract or prettier) are reported with their error.
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from results import cache_env, save
+
+EMAIL = "bench@example.com"
+
+
+def actions(phase_A, root):
+    """(name, run, memoized) for every task function, on the data under root."""
+
+    def p(name):
+        return os.path.join(root, name)
+
+    return [
+        ("install_and_run", None, False),  # timed as datagen.generate below
+        (
+            "format_markdown",
+            lambda force: phase_A.format_markdown(p("format.md")),
+            False,
+        ),
+        (
+            "count_wednesdays",
+            lambda force: phase_A.count_wednesdays(
+                p("dates.txt"), p("dates-wednesdays.txt"), force=force
+            ),
+            True,
+        ),
+        (
+            "sort_contacts",
+            lambda force: phase_A.sort_contacts(
+                p("contacts.json"), p("contacts-sorted.json"), force=force
+            ),
+            True,
+        ),
+        (
+            "extract_recent_logs",
+            lambda force: phase_A.extract_recent_logs(p("logs"), p("logs-recent.txt")),
+            False,
+        ),
+        (
+            "extract_markdown_titles",
+            lambda force: phase_A.extract_markdown_titles(
+                p("docs"), p("docs/index.json")
+            ),
+            False,
+        ),
+        (
+            "extract_email_sender",
+            lambda force: phase_A.extract_email_sender(
+                p("email.txt"), p("email-sender.txt")
+            ),
+            False,
+        ),
+        (
+            "extract_credit_card",
+            lambda force: phase_A.extract_credit_card(
+                p("credit_card.png"), p("credit-card.txt")
+            ),
+            False,
+        ),
+        (
+            "find_similar_comments",
+            lambda force: phase_A.find_similar_comments(
+                p("comments.txt"), p("comments-similar.txt"), force=force
+            ),
+            True,
+        ),
+        (
+            "calculate_sales",
+            lambda force: phase_A.calculate_sales(
+                p("ticket-sales.db"), p("ticket-sales-gold.txt"), force=force
+            ),
+            True,
+        ),
+    ]
+
+
+def empty_caches(root):
+    """
+    Returns a function that points the caches `force=True` doesn't bypass at
+    a new, empty directory under root, and restores format.md as generated.
+    """
+    import embeddings
+    import formatter
+    import logscan
+    import mdindex
+    import ocr
+
+    format_md = os.path.join(root, "format.md")
+    with open(format_md, "rb") as f:
+        original = f.read()
+    counter = itertools.count()
+
+    def reset():
+        cache = os.path.join(root, ".cache", f"cold-{next(counter)}")
+        formatter.format_cache = formatter.FormatCache(os.path.join(cache, "format.db"))
+        ocr.ocr_pool.cache_dir = os.path.join(cache, "ocr")
+        ocr.ocr_pool._cache.clear()
+        embeddings.EMBEDDING_CACHE_DIR = os.path.join(cache, "embeddings")
+        embeddings.get_store.cache_clear()
+        logscan.LOG_INDEX_DIR = os.path.join(cache, "log-index")
+        mdindex.MD_MANIFEST_DIR = os.path.join(cache, "md-manifest")
+        with open(format_md, "wb") as f:
+            f.write(original)
+
+    return reset
+
+
+def timed_run(run, force):
+    """Returns (ms, error) for one call."""
+    start = time.perf_counter()
+    result = run(force)
+    ms = (time.perf_counter() - start) * 1000
+    if isinstance(result, dict) and "error" in result:
+        return ms, str(result["error"])
+    return ms, None
+
+
+def measure(run, repeat, memoized, reset):
+    """
+    Returns timings in ms of the first call, cold repeats (after `reset`),
+    warm repeats and a memo hit.
+    """
+    cold = []
+    for _ in range(repeat + 1):
+        reset()
+        ms, error = timed_run(run, True)
+        if error:
+            return {"error": error}
+        cold.append(ms)
+
+    warm = []
+    for _ in range(repeat):
+        ms, error = timed_run(run, True)
+        if error:
+            return {"error": error}
+        warm.append(ms)
+
+    report = {
+        "first_ms": cold[0],
+        "median_ms": statistics.median(cold[1:] or cold),
+        "min_ms": min(cold[1:] or cold),
+        "warm_median_ms": statistics.median(warm or cold),
+    }
+    if memoized:
+        start = time.perf_counter()
+        run(False)
+        report["memo_hit_ms"] = (time.perf_counter() - start) * 1000
+    return report
+
+
+def bench_scale(scale, args, phase_A, datagen):
+    root = os.path.join(args.root, f"scale-{scale}")
+    start = time.perf_counter()
+    datagen.generate(EMAIL, root=root, scale=scale, resume=False)
+    datagen_ms = (time.perf_counter() - start) * 1000
+    results = {"install_and_run": {"datagen_ms": datagen_ms}}
+    phase_A.DATA_DIR = root
+    reset = empty_caches(root)
+
+    for name, run, memoized in actions(phase_A, root):
+        if run is None or (args.actions and name not in args.actions):
+            continue
+        try:
+            results[name] = measure(run, args.repeat, memoized, reset)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def print_results(results):
+    print(
+        f"{'scale':>5} {'action':<24} {'first':>10} {'median':>10} {'warm':>10} "
+        f"{'memo hit':>10}"
+    )
+    for scale, timings in results.items():
+        for name, report in timings.items():
+            if "error" in report:
+                print(f"{scale:>5} {name:<24} {report['error'][:60]}")
+                continue
+            first = report.get("first_ms", report.get("datagen_ms"))
+            median = report.get("median_ms")
+            warm = report.get("warm_median_ms")
+            hit = report.get("memo_hit_ms")
+            print(
+                f"{scale:>5} {name:<24} {first:>8.1f}ms "
+                + (f"{median:>8.1f}ms " if median is not None else f"{'-':>10} ")
+                + (f"{warm:>8.1f}ms " if warm is not None else f"{'-':>10} ")
+                + (f"{hit:>8.2f}ms" if hit is not None else f"{'-':>10}")
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--action", action="append", dest="actions")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--root", help="where datasets are generated (default: tmp)")
+    parser.add_argument("--output", help="JSON file to write (default: results/)")
+    args = parser.parse_args()
+    args.root = os.path.abspath(args.root or tempfile.mkdtemp(prefix="bench-data-"))
+
+    # Caches and stores must point inside root before the app modules load.
+    os.environ.update(cache_env(args.root))
+    os.environ.setdefault("AIPROXY_TOKEN", "bench")
+    from fake_openai import FakeOpenAI
+
+    import datagen
+    import phase_A
+
+    results = {}
+    with FakeOpenAI(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        for scale in args.scales:
+            results[str(scale)] = bench_scale(scale, args, phase_A, datagen)
+
+    print_results(results)
+    print(f"\nSaved {save('actions', results, args, args.output)}", file=sys.stderr)
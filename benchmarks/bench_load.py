@@ -0,0 +1,191 @@
+# Usage: python benchmarks/bench_load.py [--concurrency 1 8 32] [--seconds 10]
+#                                        [--scale 1] [--latency-ms 50]
+#                                        [--workers 1] [--force] [--task "..."]
+#
+# Load-tests POST /run end to end. Generates a dataset with `datagen.py`,
+# starts the server on it (uvicorn, or gunicorn with --workers > 1) with the
+# LLM and embeddings answered by the in-process fake OpenAI server, then
+# keeps `concurrency` requests in flight for `seconds` at each level.
+#
+# Reports throughput, p50/p95/p99 latency, errors and how the tasks were
+# parsed (X-Task-Source), and saves the results as JSON under
+# benchmarks/results/ (see results.py to compare two runs). Task paths use
+# {root}, the generated dataset's directory.
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+
+import httpx
+
+from bench_startup import ROOT, free_port, request
+from results import cache_env, percentile, save
+
+EMAIL = "bench@example.com"
+DEFAULT_TASKS = [
+    "Count the number of Wednesdays in {root}/dates.txt and write the number to "
+    "{root}/dates-wednesdays.txt",
+    "Sort the contacts in {root}/contacts.json by last_name, then first_name, and "
+    "write the result to {root}/contacts-sorted.json",
+    "Write the first line of the 10 most recent .log files in {root}/logs to "
+    "{root}/logs-recent.txt",
+    "Find all Markdown files in {root}/docs, take the first H1 of each and write "
+    "an index to {root}/docs/index.json",
+    "{root}/email.txt contains an email message. Write the sender's address to "
+    "{root}/email-sender.txt",
+    "Using embeddings, find the most similar pair of comments in "
+    "{root}/comments.txt and write them to {root}/comments-similar.txt",
+    "What is the total sales of all the items in the Gold ticket type in "
+    "{root}/ticket-sales.db? Write the number to {root}/ticket-sales-gold.txt",
+    # Too vague for the local router, so parsed by the (fake) LLM, then cached
+    "Which two remarks in {root}/comments.txt are closest in meaning? Put them "
+    "in {root}/comments-closest.txt",
+]
+
+
+def start_server(env, port, workers):
+    if workers > 1:
+        env = dict(env, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+    process = subprocess.Popen(
+        cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    while True:
+        try:
+            request(f"http://127.0.0.1:{port}/cache/stats")
+            return process
+        except urllib.error.URLError:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.05)
+
+
+async def load(url, tasks, concurrency, seconds, force):
+    """Keeps `concurrency` requests in flight for `seconds`."""
+    latencies, sources, errors = [], {}, {}
+    limits = httpx.Limits(max_connections=concurrency)
+    params = {"force": "true"} if force else {}
+    deadline = time.perf_counter() + seconds
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+
+        async def worker(offset):
+            i = offset
+            while time.perf_counter() < deadline:
+                task = tasks[i % len(tasks)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, params={"task": task, **params})
+                    body = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    key = f"HTTP {response.status_code}"
+                elif isinstance(body, dict) and "error" in body:
+                    key = "task error"
+                else:
+                    key = None
+                if key:
+                    errors[key] = errors.get(key, 0) + 1
+                    continue
+                latencies.append(elapsed)
+                source = response.headers.get("x-task-source", "unknown")
+                sources[source] = sources.get(source, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        duration = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "errors": errors,
+        "sources": sources,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def print_results(results):
+    print(
+        f"{'conc':>5} {'req/s':>9} {'p50':>10} {'p95':>10} {'p99':>10} "
+        f"{'errors':>7}  sources"
+    )
+    for r in results:
+        p50, p95, p99 = (
+            f"{r[key]:.1f}ms" if r[key] is not None else "-"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        errors = sum(r["errors"].values())
+        sources = ", ".join(f"{k}={v}" for k, v in sorted(r["sources"].items()))
+        print(
+            f"{r['concurrency']:>5} {r['rps']:>9.1f} {p50:>10} {p95:>10} {p99:>10} "
+            f"{errors:>7}  {sources}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument(
+        "--force", action="store_true", help="rerun tasks instead of using the memo"
+    )
+    parser.add_argument("--task", action="append", dest="tasks")
+    parser.add_argument("--root", help="where the dataset is generated (default: tmp)")
+    parser.add_argument("--output", help="JSON file to write (default: results/)")
+    args = parser.parse_args()
+    args.root = os.path.abspath(args.root or tempfile.mkdtemp(prefix="bench-data-"))
+    tasks = [task.format(root=args.root) for task in (args.tasks or DEFAULT_TASKS)]
+
+    os.environ.update(cache_env(args.root))
+    from fake_openai import FakeOpenAI
+
+    import datagen
+
+    datagen.generate(EMAIL, root=args.root, scale=args.scale)
+
+    results = []
+    with FakeOpenAI(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms) as fake:
+        env = dict(
+            os.environ,
+            DATA_DIR=args.root,
+            OPENAI_BASE_URL=fake.base_url,
+            AIPROXY_TOKEN="bench",
+        )
+        port = free_port()
+        process = start_server(env, port, args.workers)
+        url = f"http://127.0.0.1:{port}/run"
+        try:
+            asyncio.run(load(url, tasks, 4, 1, args.force))  # warm up
+            for concurrency in args.concurrency:
+                result = asyncio.run(
+                    load(url, tasks, concurrency, args.seconds, args.force)
+                )
+                results.append(result)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print_results(results)
+    print(f"\nSaved {save('load', results, args, args.output)}", file=sys.stderr)
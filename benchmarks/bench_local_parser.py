@@ -0,0 +1,128 @@
+# Usage: python benchmarks/bench_local_parser.py [--batches 1 8 16] [--repeat 3]
+#
+# Compares the original FLAN-T5 settings in `llm.generate_response` (beam
+# search, max_length=1024, fp32) with greedy generation and with the
+# constrained, batched `LocalParser`, in fp32 and int8. Reports latency per
+# task, throughput and how many tasks got the expected action.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import LocalParser, generate_response, get_model
+
+TASKS = [
+    ("Run datagen.py with user@example.com as the only argument", "install_and_run"),
+    (
+        "Format /data/format.md with prettier@3.4.2, updating it in place",
+        "format_markdown",
+    ),
+    (
+        "The file /data/dates.txt contains a list of dates. Count the Wednesdays "
+        "and write just the number to /data/dates-wednesdays.txt",
+        "count_wednesdays",
+    ),
+    (
+        "Sort the array of contacts in /data/contacts.json by last_name and "
+        "write the result to /data/contacts-sorted.json",
+        "sort_contacts",
+    ),
+    (
+        "Write the first line of the 10 most recent .log files in /data/logs/ "
+        "to /data/logs-recent.txt",
+        "extract_recent_logs",
+    ),
+    (
+        "Find all Markdown files in /data/docs/, take the first H1 of each and "
+        "write an index to /data/docs/index.json",
+        "extract_markdown_titles",
+    ),
+    (
+        "/data/email.txt contains an email message. Write the sender's address "
+        "to /data/email-sender.txt",
+        "extract_email_sender",
+    ),
+    (
+        "/data/credit_card.png contains a credit card number. Write it without "
+        "spaces to /data/credit-card.txt",
+        "extract_credit_card",
+    ),
+    (
+        "Using embeddings, find the most similar pair of comments in "
+        "/data/comments.txt and write them to /data/comments-similar.txt",
+        "find_similar_comments",
+    ),
+    (
+        "What is the total sales of all the items in the Gold ticket type in "
+        "/data/ticket-sales.db? Write the number to /data/ticket-sales-gold.txt",
+        "calculate_sales",
+    ),
+]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_generate(label, repeat, **kwargs):
+    latencies = []
+    for _ in range(repeat):
+        for task, _ in TASKS:
+            _, seconds = timed(generate_response, task, **kwargs)
+            latencies.append(seconds)
+    report(label, latencies, len(latencies), sum(latencies), None)
+
+
+def bench_parser(label, parser, batch, repeat):
+    tasks = [task for task, _ in TASKS]
+    expected = [action for _, action in TASKS]
+    latencies, total, correct, count = [], 0.0, 0, 0
+    for _ in range(repeat):
+        for start in range(0, len(tasks), batch):
+            chunk = tasks[start : start + batch]
+            results, seconds = timed(parser.classify, chunk)
+            latencies.append(seconds)
+            total += seconds
+            count += len(chunk)
+            correct += sum(
+                action == want
+                for (action, _), want in zip(results, expected[start : start + batch])
+            )
+    report(label, latencies, count, total, correct / count)
+
+
+def report(label, latencies, count, total, accuracy):
+    median = statistics.median(latencies) * 1000
+    accuracy = "-" if accuracy is None else f"{accuracy:.0%}"
+    print(f"{label:<34} {median:>10.1f}ms {count / total:>10.1f}/s {accuracy:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-baseline", action="store_true", help="skip the slow beam-search run"
+    )
+    args = parser.parse_args()
+
+    for quantize in (False, True):
+        get_model(quantize)  # load outside the timings
+
+    print(f"{'mode':<34} {'per call':>12} {'throughput':>12} {'accuracy':>8}")
+    if not args.skip_baseline:
+        bench_generate("generate beams=4 max_length=1024", 1)
+    bench_generate(
+        "generate greedy max_length=64", args.repeat, num_beams=1, max_length=64
+    )
+    for quantize in (False, True):
+        local = LocalParser(quantize=quantize)
+        for batch in args.batches:
+            label = f"constrained {'int8' if quantize else 'fp32'} batch={batch}"
+            bench_parser(label, local, batch, args.repeat)
@@ -0,0 +1,75 @@
+# Usage: python benchmarks/bench_similarity.py [--sizes 500 1000 2000] [--dim 1536]
+#
+# Compares the original per-pair Python loop in `find_similar_comments` with
+# the blocked matrix-multiply search in `similarity.py` and its LSH mode.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import approximate_top_pairs, most_similar_pair, top_k_pairs
+
+
+def loop_pair(embeddings):
+    """The original O(n^2) Python loop, kept here as the baseline."""
+    min_distance = float("inf")
+    best = (0, 1)
+    for i in range(len(embeddings)):
+        for j in range(i + 1, len(embeddings)):
+            distance = np.linalg.norm(embeddings[i] - embeddings[j])
+            if distance < min_distance:
+                min_distance = distance
+                best = (i, j)
+    return best
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def make_embeddings(n, dim, seed=0):
+    """Random unit vectors with one planted near-duplicate pair."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    embeddings[n - 1] = embeddings[n // 3] + 0.01 * rng.standard_normal(dim)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument(
+        "--loop-limit", type=int, default=2000, help="skip the loop above this size"
+    )
+    args = parser.parse_args()
+
+    print(f"{'n':>8} {'loop':>10} {'blocked':>10} {'top-10':>10} {'lsh':>10}  match")
+    for n in args.sizes:
+        embeddings = make_embeddings(n, args.dim)
+
+        loop_column = "-"
+        expected = None
+        if n <= args.loop_limit:
+            expected, loop_time = timed(loop_pair, list(embeddings))
+            loop_column = f"{loop_time:.3f}s"
+
+        exact, exact_time = timed(most_similar_pair, embeddings)
+        _, topk_time = timed(top_k_pairs, embeddings, 10)
+        approx, approx_time = timed(approximate_top_pairs, embeddings, 1)
+
+        match = expected is None or expected == exact[:2]
+        lsh_found = bool(approx) and approx[0][:2] == exact[:2]
+        print(
+            f"{n:>8} {loop_column:>10} {exact_time:>9.3f}s {topk_time:>9.3f}s "
+            f"{approx_time:>9.3f}s  {'ok' if match else 'MISMATCH'}"
+            f"{'' if lsh_found else ' (lsh missed)'}"
+        )
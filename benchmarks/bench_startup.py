@@ -0,0 +1,129 @@
+# Usage: python benchmarks/bench_startup.py [--runs 3] [--warm "" all] [--task "..."]
+#
+# Measures how long the server takes to import and answer its first request,
+# and the latency of the first task it runs, with and without `--warm`
+# preloading. Tasks run with force=true so memoized results aren't reused.
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TASKS = [
+    "Count the number of Wednesdays in /data/dates.txt and write the number to "
+    "/data/dates-wednesdays.txt",
+    "Sort the contacts in /data/contacts.json by last_name, then first_name, and "
+    "write the result to /data/contacts-sorted.json",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url, method="GET"):
+    """Returns (status, seconds) of one HTTP request."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method=method)) as r:
+            r.read()
+            status = r.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def import_time(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def start_server(env, port):
+    """Starts uvicorn and returns (process, seconds until it answers)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    while True:
+        try:
+            request(f"http://127.0.0.1:{port}/cache/stats")
+            return process, time.perf_counter() - start
+        except urllib.error.URLError:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.01)
+
+
+def run_once(warm, tasks):
+    env = dict(os.environ, WARM_ACTIONS=warm)
+    env.setdefault("AIPROXY_TOKEN", "bench")
+    port = free_port()
+    result = {"import": import_time(env)}
+    process, result["ready"] = start_server(env, port)
+    try:
+        for i, task in enumerate(tasks):
+            query = urllib.parse.urlencode({"task": task, "force": "true"})
+            url = f"http://127.0.0.1:{port}/run?{query}"
+            status, result[f"task{i}_first"] = request(url, "POST")
+            result[f"task{i}_status"] = status
+            _, result[f"task{i}_second"] = request(url, "POST")
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--warm", nargs="+", default=["", "all"], help="WARM_ACTIONS values to compare"
+    )
+    parser.add_argument("--task", action="append", dest="tasks")
+    parser.add_argument("--json", action="store_true", help="print raw results")
+    args = parser.parse_args()
+    tasks = args.tasks or DEFAULT_TASKS
+
+    results = {}
+    for warm in args.warm:
+        runs = [run_once(warm, tasks) for _ in range(args.runs)]
+        results[warm or "none"] = {
+            key: statistics.median(run[key] for run in runs) for key in runs[0]
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for i, task in enumerate(tasks):
+            print(f"task{i}: {task}")
+        print(f"\n{'warm':>8} {'import':>9} {'ready':>9}", end="")
+        for i in range(len(tasks)):
+            print(f" {f'task{i} 1st':>11} {f'task{i} 2nd':>11}", end="")
+        print()
+        for warm, medians in results.items():
+            print(
+                f"{warm:>8} {medians['import']:>8.3f}s {medians['ready']:>8.3f}s",
+                end="",
+            )
+            for i in range(len(tasks)):
+                first, second = medians[f"task{i}_first"], medians[f"task{i}_second"]
+                status = int(medians[f"task{i}_status"])
+                mark = "" if status == 200 else f"[{status}]"
+                print(f" {first * 1000:>9.1f}ms {second * 1000:>9.1f}ms{mark}", end="")
+            print()
@@ -0,0 +1,154 @@
+# Usage: python benchmarks/bench_workers.py [--workers 1 2 4 8] [--concurrency 32]
+#                                           [--seconds 10] [--task "..."] [--force]
+#
+# Starts the server under gunicorn (gunicorn.conf.py) with each number of
+# workers and drives POST /run from a pool of client threads. Reports
+# throughput, median and p95 latency, and the proportional memory (PSS) of
+# the master and its workers, which shows how much they share copy-on-write.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+from bench_startup import DEFAULT_TASKS, ROOT, free_port, request
+
+
+def start_gunicorn(workers, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    env.setdefault("AIPROXY_TOKEN", "bench")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    while True:
+        try:
+            request(f"http://127.0.0.1:{port}/cache/stats")
+            break
+        except urllib.error.URLError:
+            if process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            time.sleep(0.05)
+    # The first answer can come before every worker has booted.
+    while len(children(process.pid)) < workers:
+        time.sleep(0.05)
+    return process
+
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def pss_mb(pids):
+    """Total proportional set size of the given processes, in MB (Linux only)."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+
+def load(urls, concurrency, seconds):
+    """Sends requests from `concurrency` threads for `seconds`; returns latencies."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            try:
+                status, elapsed = request(urls[i % len(urls)], "POST")
+            except OSError:
+                status, elapsed = None, 0
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_once(workers, tasks, args):
+    port = free_port()
+    query = {"force": "true"} if args.force else {}
+    urls = [
+        f"http://127.0.0.1:{port}/run?" + urllib.parse.urlencode({"task": t, **query})
+        for t in tasks
+    ]
+    process = start_gunicorn(workers, port)
+    try:
+        load(urls, min(args.concurrency, 4), 1)  # warm caches and connections
+        latencies, errors = load(urls, args.concurrency, args.seconds)
+        memory = pss_mb([process.pid] + children(process.pid))
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        "pss_mb": memory,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--task", action="append", dest="tasks")
+    parser.add_argument(
+        "--force", action="store_true", help="rerun tasks instead of using the memo"
+    )
+    parser.add_argument("--json", action="store_true", help="print raw results")
+    args = parser.parse_args()
+    tasks = args.tasks or DEFAULT_TASKS
+
+    results = [run_once(workers, tasks, args) for workers in args.workers]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(
+            f"{'workers':>7} {'req/s':>9} {'p50':>10} {'p95':>10} {'errors':>7} "
+            f"{'PSS':>9}"
+        )
+        for r in results:
+            p50 = f"{r['p50_ms']:.1f}ms" if r["p50_ms"] is not None else "-"
+            p95 = f"{r['p95_ms']:.1f}ms" if r["p95_ms"] is not None else "-"
+            pss = f"{r['pss_mb']:.0f}MB" if r["pss_mb"] is not None else "-"
+            print(
+                f"{r['workers']:>7} {r['rps']:>9.1f} {p50:>10} {p95:>10} "
+                f"{r['errors']:>7} {pss:>9}"
+            )
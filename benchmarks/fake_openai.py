@@ -0,0 +1,208 @@
+# Usage: python benchmarks/fake_openai.py [--port 8001] [--latency-ms 50]
+#                                         [--jitter-ms 0] [--dimensions 1536]
+#
+# A local stand-in for the OpenAI API, for benchmarks and load tests that
+# shouldn't depend on (or pay for) the real service. Point the app at it with
+# OPENAI_BASE_URL=http://127.0.0.1:8001/v1 (any AIPROXY_TOKEN works).
+#
+# - POST /v1/chat/completions answers the task-parsing prompts from
+#   `prompt.py` (single and batched) with the local router's parse, and the
+#   email-sender prompt from `phase_A.py` with the From address.
+# - POST /v1/embeddings returns deterministic character-trigram vectors, so
+#   similar texts get similar embeddings.
+# - GET /stats counts the requests served.
+#
+# Every response waits latency-ms, plus up to jitter-ms derived from a hash
+# of the request, so runs are repeatable. `FakeOpenAI` runs the same server
+# in a background thread of the calling process.
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings import LocalEmbeddingBackend
+from phase_A import _EMAIL_HEAD
+from prompt import _BATCH_TAIL, _PROMPT_HEAD, _PROMPT_TAIL
+from router import ACTION_RULES, extract_params, route_task
+
+_TASK_LINE_RE = re.compile(r"^\s*\d+\. (\".*\")\s*$", re.MULTILINE)
+_FROM_RE = re.compile(r"^from:.*?([\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+)", re.I | re.M)
+_ADDRESS_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+ACTIONS = list(ACTION_RULES)
+
+
+def _digest(text: str):
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+
+
+def parse_task(task: str):
+    """The router's reading of a task, in the LLM's response schema."""
+    action, params, _ = route_task(task)
+    if action is None:
+        action = ACTIONS[_digest(task) % len(ACTIONS)]
+        params = extract_params(action, task)
+    return {"action": action, "parameters": params}
+
+
+def answer(prompt: str):
+    """Deterministic reply to one of the app's chat prompts."""
+    if prompt.startswith(_PROMPT_HEAD) and prompt.endswith(_PROMPT_TAIL):
+        task = prompt[len(_PROMPT_HEAD) : len(prompt) - len(_PROMPT_TAIL)]
+        return json.dumps(parse_task(task))
+    if prompt.endswith(_BATCH_TAIL):
+        tasks = [json.loads(line) for line in _TASK_LINE_RE.findall(prompt)]
+        return json.dumps({"results": [parse_task(task) for task in tasks]})
+    if prompt.startswith(_EMAIL_HEAD):
+        match = _FROM_RE.search(prompt)
+        if match:
+            return match.group(1)
+        match = _ADDRESS_RE.search(prompt, len(_EMAIL_HEAD))
+        return match.group(0) if match else ""
+    return "OK"
+
+
+def _tokens(text: str):
+    return max(1, len(text) // 4)
+
+
+def create_app(latency_ms=50.0, jitter_ms=0.0, dimensions=1536):
+    app = FastAPI()
+    embedder = LocalEmbeddingBackend(dimensions)
+    stats = {"chat": 0, "embeddings": 0}
+
+    async def wait(key: str):
+        delay = latency_ms
+        if jitter_ms:
+            delay += jitter_ms * (_digest(key) % 1000) / 1000
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt = next(
+            (m["content"] for m in reversed(body["messages"]) if m["role"] == "user"),
+            "",
+        )
+        await wait(prompt)
+        content = answer(prompt)
+        stats["chat"] += 1
+        prompt_tokens = sum(_tokens(m["content"]) for m in body["messages"])
+        completion_tokens = _tokens(content)
+        return {
+            "id": f"chatcmpl-{_digest(prompt):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await wait("\0".join(map(str, texts)))
+        stats["embeddings"] += 1
+        vectors = await embedder.embed([str(text) for text in texts])
+        base64_format = body.get("encoding_format") == "base64"
+        data = [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": (
+                    base64.b64encode(np.asarray(v, dtype="<f4").tobytes()).decode()
+                    if base64_format
+                    else [float(x) for x in v]
+                ),
+            }
+            for i, v in enumerate(vectors)
+        ]
+        tokens = sum(_tokens(str(text)) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+class FakeOpenAI:
+    """
+    Runs the fake server in a background thread while in use.
+
+        with FakeOpenAI(latency_ms=20) as fake:
+            os.environ["OPENAI_BASE_URL"] = fake.base_url
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, dimensions=1536, port=0):
+        if not port:
+            with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                port = s.getsockname()[1]
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        app = create_app(latency_ms, jitter_ms, dimensions)
+        config = uvicorn.Config(app, port=port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("fake OpenAI server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    print(f"OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.dimensions),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,125 @@
+# Usage: python benchmarks/results.py OLD.json NEW.json [--threshold 10]
+#
+# Helpers shared by the benchmarks that save JSON results, and a comparison
+# of two saved runs (e.g. from two commits): every numeric value present in
+# both is listed with its relative change, and changes above the threshold
+# are flagged.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def git_sha():
+    """The checked-out commit, suffixed with "-dirty" if the tree has changes."""
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}-dirty" if dirty else sha
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def cache_env(root):
+    """
+    Environment putting the data, and with it every on-disk cache and store
+    (they default to $DATA_DIR/.cache), inside root.
+    """
+    return {"DATA_DIR": root}
+
+
+def save(name, results, args=None, path=None):
+    """
+    Writes results with the commit, time, interpreter and arguments they
+    came from. Returns the path written (under benchmarks/results/ by default).
+    """
+    sha = git_sha()
+    record = {
+        "benchmark": name,
+        "git_sha": sha,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args) if args is not None else {},
+        "results": results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{name}-{sha[:12]}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def flatten(value, prefix=""):
+    """Maps "a.b.c" keys to the numeric leaves of nested dicts and lists."""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    items = {}
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, list):
+        pairs = enumerate(value)
+    else:
+        return items
+    for key, item in pairs:
+        items.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold", type=float, default=10, help="flag changes above N percent"
+    )
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"old: {old.get('git_sha')}  new: {new.get('git_sha')}")
+
+    before, after = flatten(old["results"]), flatten(new["results"])
+    width = max((len(key) for key in before if key in after), default=10)
+    for key in before:
+        if key not in after:
+            continue
+        a, b = before[key], after[key]
+        change = (b - a) / a * 100 if a else 0.0
+        flag = "  <--" if abs(change) > args.threshold else ""
+        print(f"{key:<{width}} {a:>12.4g} {b:>12.4g} {change:>+8.1f}%{flag}")
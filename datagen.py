@@ -1,6 +1,6 @@
 # DISCLAIMER: THIS SCRIPT WILL CHANGE BEFORE THE EVALUATION. TREAT THIS AS A GUIDE.
 
-# Usage: uv run datagen.py <email>
+# Usage: uv run datagen.py <email> [--root /data] [--scale N] [--jobs N] [--force]
 
 # /// script
 # requires-python = ">=3.13"
@@ -12,15 +12,20 @@
 
 import datetime
 import hashlib
+import itertools
 import json
 import os
 import random
 import sqlite3
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image, ImageDraw, ImageFont
 from faker import Faker
 
-config = {"root": "/data"}
+config = {"root": "/data", "scale": 1}
+
+MANIFEST = ".datagen-manifest.json"
+TICKET_BATCH_SIZE = 10_000
 
 
 def num(str):
@@ -32,6 +37,20 @@ def write_file(path, content):
         f.write(content)
 
 
+def stream_file(path, parts, sep="\n", start="", end=""):
+    """Writes parts joined by sep as they are generated, replacing path atomically."""
+    target = os.path.join(config["root"], path)
+    tmp = f"{target}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(start)
+        for i, part in enumerate(parts):
+            if i:
+                f.write(sep)
+            f.write(part)
+        f.write(end)
+    os.replace(tmp, target)
+
+
 def get_markdown(email):
     return f"""#Unformatted Markdown
 
@@ -57,7 +76,7 @@ def a2_format_markdown():
 
 
 def get_dates(email):
-    random.seed(f"{email}:a3", version=2)
+    rng = random.Random(f"{email}:a3")
     start_date = datetime.datetime(2000, 1, 1)
     end_date = datetime.datetime(2024, 12, 31)
     formats = [
@@ -66,17 +85,18 @@ def get_dates(email):
         "%b %d, %Y",  # Mar 14, 2024
         "%Y/%m/%d %H:%M:%S",  # 2024/03/14 15:30:45
     ]
-    timestamps = random.sample(
-        range(int(start_date.timestamp()), int(end_date.timestamp())), 1000
+    timestamps = rng.sample(
+        range(int(start_date.timestamp()), int(end_date.timestamp())),
+        1000 * config["scale"],
     )
-    return [
-        datetime.datetime.fromtimestamp(ts).strftime(random.choice(formats))
+    return (
+        datetime.datetime.fromtimestamp(ts).strftime(rng.choice(formats))
         for ts in timestamps
-    ]
+    )
 
 
 def a3_dates():
-    """Save 1,000 random non-unique dates between 2000-01-01 and 2024-12-31 at dates.txt
+    """Save 1,000 (x scale) random non-unique dates between 2000-01-01 and 2024-12-31 at dates.txt
 
     Generates dates in various unambiguous formats:
     - ISO 8601: yyyy-mm-dd
@@ -84,43 +104,41 @@ def a3_dates():
     - MMM dd, yyyy
     - yyyy/mm/dd HH:MM:SS
     """
-    dates = get_dates(config["email"])
-    write_file("dates.txt", "\n".join(dates))
+    stream_file("dates.txt", get_dates(config["email"]))
 
 
 def get_contacts(email):
     fake = Faker()
     fake.seed_instance(num(f"{email}:a4"))
-    return [
+    return (
         {
             "first_name": fake.first_name(),
             "last_name": fake.last_name(),
             "email": fake.email(),
         }
-        for _ in range(100)
-    ]
+        for _ in range(100 * config["scale"])
+    )
 
 
 def a4_contacts():
-    """Generate a JSON with 100 contacts with random first_name, last_name, and email"""
-    contacts = get_contacts(config["email"])
-    write_file("contacts.json", json.dumps(contacts))
+    """Generate a JSON with 100 (x scale) contacts with random first_name, last_name, and email"""
+    contacts = (json.dumps(contact) for contact in get_contacts(config["email"]))
+    # Same bytes as json.dumps() of the whole list, without building it
+    stream_file("contacts.json", contacts, sep=", ", start="[", end="]")
 
 
 def get_logs(email):
-    files = []
-    random.seed(f"{email}:a5", version=2)
+    rng = random.Random(f"{email}:a5")
     fake = Faker()
     fake.seed_instance(num(f"{email}:a5"))
-    for i in range(50):
+    for i in range(50 * config["scale"]):
         text = "\n".join([fake.text() for _ in range(10)])
-        age = random.randint(1, 24 * 60 * 60 * 365)
-        files.append((age, text))
-    return files
+        age = rng.randint(1, 24 * 60 * 60 * 365)
+        yield age, text
 
 
 def a5_logs():
-    """Generate 50 log files with 10 lines each of random content at logs/"""
+    """Generate 50 (x scale) log files with 10 lines each of random content at logs/"""
     email = config["email"]
     os.makedirs(os.path.join(config["root"], "logs"), exist_ok=True)
     now = time.time()
@@ -132,22 +150,20 @@ def a5_logs():
 
 
 def get_docs(email):
-    files = []
-    random.seed(f"{email}:a6", version=2)
+    rng = random.Random(f"{email}:a6")
     fake = Faker()
     fake.seed_instance(num(f"{email}:a6"))
-    for dir in fake.words(10):
+    for dir in fake.words(10 * config["scale"]):
         for file in fake.words(10):
-            prefix = "\n".join([fake.text() for _ in range(random.randint(0, 10))])
+            prefix = "\n".join([fake.text() for _ in range(rng.randint(0, 10))])
             heading = f"# {fake.sentence()}"
-            suffix = "\n".join([fake.text() for _ in range(random.randint(0, 10))])
+            suffix = "\n".join([fake.text() for _ in range(rng.randint(0, 10))])
             text = "\n".join([prefix, heading, suffix])
-            files.append((dir, file, text))
-    return files
+            yield dir, file, text
 
 
 def a6_docs():
-    """Generate 10 Markdown files each under 10 random subdirectories with random content."""
+    """Generate 10 Markdown files each under 10 (x scale) random subdirectories with random content."""
     email = config["email"]
     docs = get_docs(email)
     os.makedirs(os.path.join(config["root"], "docs"), exist_ok=True)
@@ -242,33 +258,39 @@ def a8_credit_card_image():
 def get_comments(email):
     fake = Faker()
     fake.seed_instance(num(f"{email}:a9"))
-    return [fake.paragraph() for _ in range(100)]
+    return (fake.paragraph() for _ in range(100 * config["scale"]))
 
 
 def a9_comments():
-    """Generate a comments.txt file with 100 random comments"""
-    write_file("comments.txt", "\n".join(get_comments(config["email"])))
+    """Generate a comments.txt file with 100 (x scale) random comments"""
+    stream_file("comments.txt", get_comments(config["email"]))
 
 
 def get_tickets(email):
-    random.seed(f"{email}:a10", version=2)
+    rng = random.Random(f"{email}:a10")
     ticket_types = ["Gold", "Silver", "Bronze"]
-    return [
+    return (
         (
-            random.choice(ticket_types),
-            random.randint(1, 10),
-            round(random.uniform(50, 150), 2),
+            rng.choice(ticket_types),
+            rng.randint(1, 10),
+            round(rng.uniform(50, 150), 2),
         )
-        for _ in range(1000)
-    ]
+        for _ in range(1000 * config["scale"])
+    )
 
 
 def a10_ticket_sales():
     """Generate ticket-sales.db with a tickets(type, units, price) table. 1 row per ticket"""
     target = os.path.join(config["root"], "ticket-sales.db")
-    if os.path.exists(target):
-        os.remove(target)
-    conn = sqlite3.connect(target)
+    tmp = f"{target}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    # Nothing to recover if loading fails: the file is rebuilt from scratch.
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA cache_size=-65536")
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -279,11 +301,114 @@ def a10_ticket_sales():
         )
     """
     )
-    cursor.executemany(
-        "INSERT INTO tickets VALUES (?, ?, ?)", get_tickets(config["email"])
-    )
-    conn.commit()
+    cursor.execute("BEGIN")
+    tickets = get_tickets(config["email"])
+    while batch := list(itertools.islice(tickets, TICKET_BATCH_SIZE)):
+        cursor.executemany("INSERT INTO tickets VALUES (?, ?, ?)", batch)
+    cursor.execute("COMMIT")
     conn.close()
+    os.replace(tmp, target)
+
+
+STEPS = [
+    a2_format_markdown,
+    a3_dates,
+    a4_contacts,
+    a5_logs,
+    a6_docs,
+    a7_email,
+    a8_credit_card_image,
+    a9_comments,
+    a10_ticket_sales,
+]
+# What each generator writes under root, checked before a step is skipped.
+OUTPUTS = {
+    "a2_format_markdown": "format.md",
+    "a3_dates": "dates.txt",
+    "a4_contacts": "contacts.json",
+    "a5_logs": "logs",
+    "a6_docs": "docs",
+    "a7_email": "email.txt",
+    "a8_credit_card_image": "credit_card.png",
+    "a9_comments": "comments.txt",
+    "a10_ticket_sales": "ticket-sales.db",
+}
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def run_step(name, settings):
+    """Runs one generator in a worker process with the parent's config."""
+    config.update(settings)
+    start = time.perf_counter()
+    globals()[name]()
+    return time.perf_counter() - start
+
+
+def generate(email, root="/data", scale=1, jobs=None, resume=True):
+    """
+    Generates every dataset under root, running the generators in parallel.
+
+    Each generator is recorded in a manifest in root once it finishes, so an
+    interrupted run only redoes the unfinished ones (and any whose output
+    has gone missing) when repeated with the same email and scale. Once a
+    run completes, the next one starts over. Scale 1 produces the original
+    datasets.
+
+    Returns the names of the generators that ran.
+    """
+    root = os.path.abspath(root)
+    os.makedirs(root, exist_ok=True)
+    config.update({"email": email, "root": root, "scale": scale})
+    settings = dict(config)
+
+    manifest = load_manifest(root) if resume else {}
+    if (
+        manifest.get("complete", True)
+        or manifest.get("email") != email
+        or manifest.get("scale") != scale
+    ):
+        manifest = {"email": email, "scale": scale, "complete": False, "done": {}}
+    todo = [
+        step.__name__
+        for step in STEPS
+        if step.__name__ not in manifest["done"]
+        or not os.path.exists(os.path.join(root, OUTPUTS[step.__name__]))
+    ]
+    for name in todo:
+        manifest["done"].pop(name, None)
+    save_manifest(root, manifest)
+
+    def finished(name, seconds):
+        manifest["done"][name] = round(seconds, 3)
+        save_manifest(root, manifest)
+        print(f"{name}: {seconds:.2f}s")
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(todo) <= 1:
+        for name in todo:
+            finished(name, run_step(name, settings))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            futures = {pool.submit(run_step, name, settings): name for name in todo}
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+    manifest["complete"] = True
+    save_manifest(root, manifest)
+    return todo
 
 
 if __name__ == "__main__":
@@ -292,25 +417,28 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("email")
     parser.add_argument("--root", default="/data")
+    parser.add_argument(
+        "--scale", type=int, default=1, help="Multiply dataset sizes by N"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Worker processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Ignore the manifest; redo everything"
+    )
     args = parser.parse_args()
-    config["email"] = args.email
-    config["root"] = os.path.abspath(args.root)
-
-    os.makedirs(config["root"], exist_ok=True)
 
     print(
         "DISCLAIMER: THIS SCRIPT WILL CHANGE BEFORE THE EVALUATION. TREAT THIS AS A GUIDE."
     )
-    print("Files created at", config["root"])
-
-    a2_format_markdown()
-    a3_dates()
-    a4_contacts()
-    a5_logs()
-    a6_docs()
-    a7_email()
-    a8_credit_card_image()
-    a9_comments()
-    a10_ticket_sales()
+    print("Files created at", os.path.abspath(args.root))
+
+    generate(
+        args.email,
+        root=args.root,
+        scale=args.scale,
+        jobs=args.jobs,
+        resume=not args.force,
+    )
 
 # DISCLAIMER: THIS SCRIPT WILL CHANGE BEFORE THE EVALUATION. TREAT THIS AS A GUIDE.
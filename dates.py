@@ -0,0 +1,142 @@
+import datetime
+import re
+from functools import lru_cache
+
+########## CONST ##########
+# Formats produced by `datagen.get_dates` plus a few other common ones.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d-%b-%Y",
+    "%b %d, %Y",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d %b %Y",
+    "%B %d, %Y",
+    "%d-%B-%Y",
+]
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+MONTHS = {
+    name: number
+    for number in range(1, 13)
+    for name in (
+        datetime.date(2000, number, 1).strftime("%b").lower(),
+        datetime.date(2000, number, 1).strftime("%B").lower(),
+    )
+}
+
+_DIRECTIVES = {
+    "%Y": r"(?P<Y>\d{4})",
+    "%m": r"(?P<m>\d{1,2})",
+    "%d": r"(?P<d>\d{1,2})",
+    "%b": r"(?P<b>[A-Za-z]{3})",
+    "%B": r"(?P<b>[A-Za-z]+)",
+    "%H": r"\d{1,2}",
+    "%M": r"\d{1,2}",
+    "%S": r"\d{1,2}",
+}
+_SHAPE_TABLE = str.maketrans(
+    "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "9" * 10 + "a" * 52,
+)
+
+
+def _compile(fmt: str):
+    """Turns a strptime format into a regex that captures year, month and day."""
+    pattern = re.sub(
+        r"%[A-Za-z]|[^%]+",
+        lambda m: _DIRECTIVES.get(m.group(0)) or re.escape(m.group(0)),
+        fmt,
+    )
+    return re.compile(pattern + r"$")
+
+
+_PATTERNS = [_compile(fmt) for fmt in DATE_FORMATS]
+
+# Line shape (digits -> 9, letters -> a) -> index into _PATTERNS.
+_shape_formats = {}
+
+
+def _to_date(match):
+    parts = match.groupdict()
+    month = int(parts["m"]) if "m" in parts else MONTHS[parts["b"].lower()]
+    return datetime.date(int(parts["Y"]), month, int(parts["d"]))
+
+
+def _infer(text: str):
+    for index, pattern in enumerate(_PATTERNS):
+        match = pattern.match(text)
+        if match:
+            try:
+                return index, _to_date(match)
+            except (KeyError, ValueError):
+                continue
+    return None, None
+
+
+@lru_cache(maxsize=65536)
+def parse_weekday(text: str):
+    """
+    Returns the weekday (0 = Monday) of a date string, or None if unparseable.
+
+    The matching format is cached per line shape, so each shape is inferred
+    once and later lines go straight to one precompiled regex instead of
+    trying `strptime` with every format.
+    """
+    shape = text.translate(_SHAPE_TABLE)
+    index = _shape_formats.get(shape)
+    if index is not None:
+        match = _PATTERNS[index].match(text)
+        if match:
+            try:
+                return _to_date(match).weekday()
+            except (KeyError, ValueError):
+                pass
+
+    index, date = _infer(text)
+    if date is None:
+        return None
+    _shape_formats[shape] = index
+    return date.weekday()
+
+
+def weekday_index(weekday):
+    """Accepts a weekday as an index (0 = Monday), full name or abbreviation."""
+    if isinstance(weekday, int):
+        return weekday % 7
+    name = str(weekday).strip().lower()
+    for index, day in enumerate(WEEKDAYS):
+        if len(name) >= 2 and day.startswith(name.rstrip("s")):
+            return index
+    raise ValueError(f"Unknown weekday: {weekday}")
+
+
+def weekday_histogram(path: str):
+    """
+    Counts the dates in a file per weekday, streaming it line by line.
+
+    Returns:
+        tuple: (counts, unparsed) where counts[0] is the number of Mondays.
+    """
+    counts = [0] * 7
+    unparsed = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            text = line.strip()
+            if not text:
+                continue
+            weekday = parse_weekday(text)
+            if weekday is None:
+                unparsed += 1
+            else:
+                counts[weekday] += 1
+    return counts, unparsed
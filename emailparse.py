@@ -0,0 +1,49 @@
+import os
+from email.parser import BytesHeaderParser
+from email.utils import getaddresses
+
+########## CONST ##########
+EMAIL_HEADER_LIMIT = 1 << 16
+# Only this much of an email is sent to the LLM when header parsing fails.
+LLM_EMAIL_CHARS = int(os.getenv("LLM_EMAIL_CHARS", "2000"))
+EMAIL_SUFFIXES = (".txt", ".eml")
+
+_parser = BytesHeaderParser()
+
+
+def read_header_block(path: str, limit: int = EMAIL_HEADER_LIMIT):
+    """Reads an RFC 5322 message up to the blank line ending its headers."""
+    lines, size = [], 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                break
+            lines.append(line)
+            size += len(line)
+            if size >= limit:
+                break
+    return b"".join(lines)
+
+
+def sender_from_headers(headers: bytes):
+    """Returns the address in the From (or Sender) header, or None."""
+    message = _parser.parsebytes(headers)
+    for name in ("From", "Sender"):
+        values = message.get_all(name)
+        if not values:
+            continue
+        for _, address in getaddresses([str(value) for value in values]):
+            if "@" in address:
+                return address
+    return None
+
+
+def sender_from_file(path: str):
+    """Extracts the sender of an email file from its headers alone, or None."""
+    return sender_from_headers(read_header_block(path))
+
+
+def read_excerpt(path: str, limit: int = LLM_EMAIL_CHARS):
+    """The start of an email, for the LLM fallback prompt."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(limit)
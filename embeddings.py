@@ -0,0 +1,245 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from metrics import inc, record_usage, span
+from prompt import get_async_client
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(DATA_DIR, ".cache", "embeddings")
+)
+
+
+class OpenAIEmbeddingBackend:
+    """Embeds texts with the OpenAI embeddings API, many inputs per request."""
+
+    def __init__(self, model=EMBEDDING_MODEL, client=None):
+        self.model = model
+        self.client = client
+
+    async def embed(self, texts: list):
+        client = self.client or get_async_client()
+        response = await client.embeddings.create(model=self.model, input=texts)
+        record_usage("embedding", response)
+        data = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in data]
+
+
+class LocalEmbeddingBackend:
+    """
+    Deterministic offline stand-in for the embeddings API.
+
+    Texts are hashed into a fixed number of buckets by character trigram, so
+    similar texts get similar vectors without any network access.
+    """
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.model = f"local-trigram-{dimensions}"
+
+    def _vector(self, text: str):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        text = f"  {text.casefold()} "
+        for i in range(len(text) - 2):
+            h = zlib.crc32(text[i : i + 3].encode())
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def embed(self, texts: list):
+        return [self._vector(text) for text in texts]
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk cache of float32 embeddings keyed by content hash.
+
+    Vectors live in a raw `vectors.f32` file read through `np.memmap`, with the
+    matching keys one per line in `keys.txt` and the vector width in
+    `dimensions`. Appends take a file lock so several processes can share one
+    store.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.dimensions_path = os.path.join(directory, "dimensions")
+        self._rows = {}
+        self._keys_offset = 0
+        self._dimensions = None
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _refresh(self):
+        """Picks up keys appended since the last read, by us or another process."""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        # A writer may be mid-append: leave a torn last line for the next read.
+        complete = data[: data.rfind(b"\n") + 1]
+        self._keys_offset += len(complete)
+        new_keys = complete.decode().splitlines()
+        for key in new_keys:
+            self._rows.setdefault(key, len(self._rows))
+        if new_keys or self._vectors is None:
+            self._map_vectors()
+
+    def _map_vectors(self):
+        if not self._rows or not os.path.exists(self.vectors_path):
+            self._vectors = None
+            return
+        with open(self.dimensions_path, "r") as f:
+            self._dimensions = int(f.read())
+        self._vectors = np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(len(self._rows), self._dimensions),
+        )
+
+    def get_many(self, keys: list):
+        """Returns {key: vector} for the keys that are already stored."""
+        with self._lock:
+            self._refresh()
+            return {
+                key: np.array(self._vectors[self._rows[key]])
+                for key in keys
+                if key in self._rows and self._vectors is not None
+            }
+
+    def add(self, keys: list, vectors: np.ndarray):
+        """Appends new vectors; keys already present are skipped."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, open(self.keys_path, "a") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+                if not fresh:
+                    return
+                width = vectors.shape[1]
+                if self._dimensions and width != self._dimensions:
+                    raise ValueError(f"Expected {self._dimensions}-d, got {width}-d")
+
+                if not self._dimensions:
+                    with open(self.dimensions_path, "w") as f:
+                        f.write(str(vectors.shape[1]))
+                    self._dimensions = vectors.shape[1]
+
+                # Drop rows left behind by a writer that died before adding keys.
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(len(self._rows) * vectors.shape[1] * 4)
+                    f.write(vectors[fresh].tobytes())
+                keys_file.write("".join(keys[i] + "\n" for i in fresh))
+                keys_file.flush()
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+            self._refresh()
+
+
+def content_key(model: str, text: str):
+    """Cache key for a text embedded with a given model."""
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_backend(name=EMBEDDING_BACKEND):
+    """Returns the configured embedding backend ("openai" or "local")."""
+    if name == "local":
+        return LocalEmbeddingBackend()
+    return OpenAIEmbeddingBackend()
+
+
+@lru_cache(maxsize=None)
+def get_store(model: str):
+    """Returns the on-disk store for a model, or None if the cache dir is unusable."""
+    if not EMBEDDING_CACHE_DIR:
+        return None
+    try:
+        return EmbeddingStore(
+            os.path.join(EMBEDDING_CACHE_DIR, model.replace("/", "_"))
+        )
+    except OSError as e:
+        print(f"Embedding cache disabled: {e}")
+        return None
+
+
+async def embed_texts(
+    texts: list,
+    backend=None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    concurrency: int = EMBEDDING_CONCURRENCY,
+):
+    """
+    Embeds texts in batched requests, reusing cached vectors where possible.
+
+    Parameters:
+    - texts (list): Texts to embed; duplicates are embedded once.
+    - backend: Embedding backend; defaults to the one set by EMBEDDING_BACKEND.
+    - batch_size (int): Maximum inputs per embeddings request.
+    - concurrency (int): Maximum requests in flight at once.
+
+    Returns:
+    - np.ndarray: float32 matrix with one row per input text.
+    """
+    backend = backend or get_backend()
+    store = get_store(backend.model)
+
+    keys = [content_key(backend.model, text) for text in texts]
+    unique = dict(zip(keys, texts))
+    vectors = store.get_many(list(unique)) if store else {}
+
+    missing = [key for key in unique if key not in vectors]
+    inc("embedding_cache_lookups_total", len(unique) - len(missing), result="hit")
+    inc("embedding_cache_lookups_total", len(missing), result="miss")
+    batches = [
+        missing[i : i + batch_size] for i in range(0, len(missing), batch_size)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_batch(batch):
+        async with semaphore:
+            result = await backend.embed([unique[key] for key in batch])
+        result = np.asarray(result, dtype=np.float32)
+        if store:
+            await asyncio.to_thread(store.add, batch, result)
+        vectors.update(zip(batch, result))
+
+    with span("embed"):
+        await asyncio.gather(*(embed_batch(batch) for batch in batches))
+
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[key] for key in keys])
+
+
+def embed_texts_sync(texts: list, backend=None, **kwargs):
+    """Blocking wrapper around `embed_texts` for callers outside an event loop."""
+
+    async def run():
+        if backend is not None or EMBEDDING_BACKEND == "local":
+            return await embed_texts(texts, backend=backend, **kwargs)
+        # The shared async client is tied to the server's loop; use a private one.
+        async with AsyncOpenAI(api_key=os.getenv("AIPROXY_TOKEN")) as client:
+            return await embed_texts(
+                texts, backend=OpenAIEmbeddingBackend(client=client), **kwargs
+            )
+
+    return asyncio.run(run())
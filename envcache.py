@@ -0,0 +1,122 @@
+import fcntl
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from importlib import metadata
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+ENV_CACHE_DIR = os.getenv("ENV_CACHE_DIR", os.path.join(DATA_DIR, ".cache", "env"))
+# Wheels kept here let the environment be reinstalled without network access.
+WHEEL_DIR = os.getenv("WHEEL_DIR", os.path.join(ENV_CACHE_DIR, "wheels"))
+
+_PIN_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._\-]*)\s*==\s*([^\s;#]+)")
+
+
+def _default_run(cmd):
+    subprocess.run(cmd, check=True)
+
+
+def fingerprint(requirements: str):
+    """Hash of a requirements file's contents and the running interpreter."""
+    digest = hashlib.sha256()
+    with open(requirements, "rb") as f:
+        digest.update(f.read())
+    digest.update(f"\0{sys.executable}\0{sys.version}\0{platform.machine()}".encode())
+    return digest.hexdigest()
+
+
+def unsatisfied(requirements: str):
+    """Returns the `name==version` pins the installed packages don't match."""
+    missing = []
+    with open(requirements, "r") as f:
+        for line in f:
+            match = _PIN_RE.match(line)
+            if not match:
+                continue
+            name, version = match.groups()
+            try:
+                installed = metadata.version(name)
+            except metadata.PackageNotFoundError:
+                installed = None
+            if installed != version:
+                missing.append(f"{name}=={version}")
+    return missing
+
+
+def _stamp_path(key: str):
+    return os.path.join(ENV_CACHE_DIR, f"{key}.json")
+
+
+def _installer():
+    """`uv pip` if uv is importable, else pip, both for this interpreter."""
+    python = sys.executable
+    if importlib.util.find_spec("uv") is not None:
+        return [python, "-m", "uv", "pip", "install", "--python", python]
+    return [python, "-m", "pip", "install"]
+
+
+def ensure_environment(requirements: str = "requirements.txt", run=_default_run):
+    """
+    Installs a requirements file into the running interpreter, unless an
+    install with the same fingerprint was already done and every pinned
+    version is still in place.
+
+    Wheels are collected in WHEEL_DIR first and installed from there only,
+    so a later reinstall works offline. A file lock keeps server processes
+    from installing at the same time.
+
+    Parameters:
+    - requirements (str): Path to the requirements file.
+    - run: Function running a command, raising on a non-zero exit.
+
+    Returns:
+        dict: {"fingerprint", "installed": bool, "seconds"}
+    """
+    start = time.perf_counter()
+    key = fingerprint(requirements)
+    os.makedirs(WHEEL_DIR, exist_ok=True)
+
+    with open(os.path.join(ENV_CACHE_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(_stamp_path(key)) and not unsatisfied(requirements):
+            return {
+                "fingerprint": key,
+                "installed": False,
+                "seconds": round(time.perf_counter() - start, 6),
+            }
+
+        try:
+            run(
+                [sys.executable, "-m", "pip", "wheel", "-q", "-r", requirements]
+                + ["-w", WHEEL_DIR, "--find-links", WHEEL_DIR]
+            )
+        except subprocess.CalledProcessError as e:
+            # Offline, or a package without a wheel: install from what we have.
+            print(f"Could not refresh the wheel cache: {e}")
+        run(
+            _installer()
+            + ["--no-index", "--find-links", WHEEL_DIR, "-r", requirements]
+        )
+
+        with open(_stamp_path(key), "w") as f:
+            json.dump(
+                {
+                    "requirements": os.path.abspath(requirements),
+                    "python": sys.version,
+                    "executable": sys.executable,
+                    "installed_at": time.time(),
+                },
+                f,
+            )
+    return {
+        "fingerprint": key,
+        "installed": True,
+        "seconds": round(time.perf_counter() - start, 6),
+    }
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+
+########## CONST ##########
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "16"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "64"))
+# Pools never fork the server itself: its threads, locks and open SQLite
+# connections would be copied into every worker.
+MP_START_METHOD = os.getenv("MP_START_METHOD", "forkserver")
+
+
+def mp_context():
+    """Start method for worker pools, falling back to spawn where unsupported."""
+    if MP_START_METHOD in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context(MP_START_METHOD)
+    return multiprocessing.get_context("spawn")
+
+
+class QueueFull(Exception):
+    """Raised when a run is submitted while the admission queue is full."""
+
+
+class AdmissionController:
+    """Caps concurrent runs and rejects new ones once the wait queue is full."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_RUNS, max_queued=MAX_QUEUED_RUNS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._pending = 0
+
+    @property
+    def pending(self):
+        """Number of runs currently executing or waiting for a slot."""
+        return self._pending
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._pending >= self.max_concurrent + self.max_queued:
+            raise QueueFull(f"{self._pending} runs already pending")
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self._pending -= 1
+
+
+_process_pool = None
+
+
+def get_process_pool(broken=None):
+    """
+    Returns the shared process pool for CPU-bound steps, creating it on first
+    use, or again when `broken` (a pool that lost a worker) is the current one.
+    """
+    global _process_pool
+    if broken is not None and _process_pool is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=mp_context()
+        )
+    return _process_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Runs a picklable CPU-bound function in the process pool, retrying once
+    on a fresh pool if a worker died.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    try:
+        return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        pool = get_process_pool(broken=pool)
+        return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    """Stops the process pool; called when the app shuts down."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
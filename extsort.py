@@ -0,0 +1,159 @@
+import heapq
+import json
+import os
+import re
+import tempfile
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+SORT_RUN_SIZE = int(os.getenv("SORT_RUN_SIZE", "100000"))
+SORT_TMP_DIR = os.getenv("SORT_TMP_DIR", os.path.join(DATA_DIR, ".tmp"))
+READ_CHUNK_SIZE = 1 << 16
+
+# What may follow a complete array element.
+_ELEMENT_END_RE = re.compile(r"[\s,\]]")
+
+
+def iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE):
+    """Yields the elements of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip(" \t\r\n")
+    if buf[pos : pos + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    skip(" \t\r\n")
+    if buf[pos : pos + 1] == "]":
+        return
+
+    while True:
+        skip(" \t\r\n")
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if not eof and (
+            end == len(buf)
+            or (
+                isinstance(item, (int, float))
+                and not _ELEMENT_END_RE.match(buf, end)
+            )
+        ):
+            # A number at the end of the buffer may continue in the next chunk,
+            # also past a "." or "e" that stopped the decoder (e.g. "3." | "25").
+            fill()
+            continue
+        pos = end
+        yield item
+
+        skip(" \t\r\n")
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if buf[pos] != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {buf[pos]!r}")
+        pos += 1
+
+
+def write_json_array(items, f, compact: bool = False):
+    """Writes items as a JSON array; the layout matches `json.dump(..., indent=2)`."""
+    first = True
+    f.write("[")
+    for item in items:
+        if compact:
+            f.write(("" if first else ",") + json.dumps(item, separators=(",", ":")))
+        else:
+            text = json.dumps(item, indent=2).replace("\n", "\n  ")
+            f.write(("\n  " if first else ",\n  ") + text)
+        first = False
+    f.write("]" if compact or first else "\n]")
+
+
+def _spill(run, key, tmp_dir):
+    run.sort(key=key)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=tmp_dir, prefix="sort-run-", suffix=".jsonl", delete=False
+    ) as f:
+        for item in run:
+            f.write(json.dumps(item) + "\n")
+    return f.name
+
+
+def _read_run(path):
+    with open(path, "r") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def external_sort(
+    input_path: str,
+    output_path: str,
+    keys=("last_name", "first_name"),
+    run_size: int = SORT_RUN_SIZE,
+    compact: bool = False,
+    tmp_dir: str = SORT_TMP_DIR,
+):
+    """
+    Sorts a JSON array of objects by the given keys in bounded memory.
+
+    The array is parsed incrementally; every `run_size` items are sorted and
+    spilled to a temporary run file under `tmp_dir`, and the runs are k-way
+    merged into the output. Inputs that fit in one run never touch disk.
+
+    Returns:
+        int: Number of items written.
+    """
+
+    def key(item):
+        return tuple(item[k] for k in keys)
+
+    runs, run, count = [], [], 0
+
+    try:
+        with open(input_path, "r", encoding="utf-8") as f:
+            for item in iter_json_array(f):
+                run.append(item)
+                count += 1
+                if len(run) >= run_size:
+                    os.makedirs(tmp_dir, exist_ok=True)
+                    runs.append(_spill(run, key, tmp_dir))
+                    run = []
+
+        if runs:
+            if run:
+                runs.append(_spill(run, key, tmp_dir))
+                run = []
+            items = heapq.merge(*(_read_run(path) for path in runs), key=key)
+        else:
+            run.sort(key=key)
+            items = run
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            write_json_array(items, f, compact=compact)
+    finally:
+        for path in runs:
+            os.remove(path)
+
+    return count
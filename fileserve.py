@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import zlib
+from email.utils import formatdate
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+READ_CHUNK_SIZE = int(os.getenv("READ_CHUNK_SIZE", str(1 << 16)))
+GZIP_MIN_SIZE = 1024
+# Already-compressed formats are not worth gzipping again.
+NO_GZIP_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".gz", ".zip", ".db")
+
+
+def resolve_path(path: str):
+    """Maps a request path onto DATA_DIR, rejecting paths that escape it."""
+    root = os.path.realpath(DATA_DIR)
+    full_path = os.path.realpath(os.path.join(root, path.lstrip("/")))
+    if not os.path.exists(full_path) and path.startswith(DATA_DIR + "/"):
+        full_path = os.path.realpath(path)
+    elif not os.path.exists(full_path) and path.startswith("/data/"):
+        # Task paths say /data even when DATA_DIR is elsewhere.
+        full_path = os.path.realpath(os.path.join(root, path[len("/data/") :]))
+    if os.path.commonpath([root, full_path]) != root:
+        raise HTTPException(status_code=403, detail="Path outside the data directory")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return full_path
+
+
+def make_etag(st):
+    """Validator derived from mtime and size, so unchanged files give 304s."""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _etag_matches(header: str, etag: str):
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_range(header: str, size: int):
+    """
+    Parses a single `bytes=` range into inclusive (start, end).
+
+    Returns None for headers we don't serve partially (other units or several
+    ranges), which are answered with the whole file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _iter_file(full_path: str, start: int, end: int):
+    """
+    Yields bytes start..end (inclusive) of a file in READ_CHUNK_SIZE reads.
+
+    Plain reads rather than an mmap: tasks rewrite files in place, and a
+    mapped page of a file truncated mid-stream would kill the worker with
+    SIGBUS. Here the body just ends early.
+    """
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        remaining = end + 1 - start
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _iter_gzip(full_path: str):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(full_path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def file_response(full_path: str, request: Request):
+    """
+    Serves a file in chunks with conditional, range and gzip support.
+
+    - `If-None-Match` matching the mtime+size ETag returns 304.
+    - A single `Range` (honouring `If-Range`) returns 206 with just that slice.
+    - `Accept-Encoding: gzip` compresses the stream for compressible files.
+
+    Bodies are read a chunk at a time, so only one chunk is held in memory
+    whatever the file size. The gzip body gets its own ETag, since its bytes
+    differ from the file's.
+    """
+    st = os.stat(full_path)
+    media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+    use_gzip = (
+        "gzip" in request.headers.get("accept-encoding", "")
+        and st.st_size >= GZIP_MIN_SIZE
+        and not full_path.lower().endswith(NO_GZIP_SUFFIXES)
+    )
+    identity_etag = make_etag(st)
+    etag = f'{identity_etag[:-1]}-gzip"' if use_gzip else identity_etag
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and st.st_size and (not if_range or if_range == identity_etag):
+        byte_range = parse_range(range_header, st.st_size)
+        if byte_range:
+            start, end = byte_range
+            headers["ETag"] = identity_etag
+            headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file(full_path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(
+            _iter_gzip(full_path), media_type=media_type, headers=headers
+        )
+
+    headers["Content-Length"] = str(st.st_size)
+    if not st.st_size:
+        return Response(b"", media_type=media_type, headers=headers)
+    return StreamingResponse(
+        _iter_file(full_path, 0, st.st_size - 1),
+        media_type=media_type,
+        headers=headers,
+    )
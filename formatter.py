@@ -0,0 +1,293 @@
+import glob
+import json
+import os
+import selectors
+import sqlite3
+import subprocess
+import threading
+import time
+from functools import lru_cache
+
+from memo import file_hash
+from metrics import inc, span
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+PRETTIER_VERSION = os.getenv("PRETTIER_VERSION", "3.4.2")
+PRETTIER_DAEMON = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "prettier_daemon.js"
+)
+# Where the daemon looks for the `prettier` package; defaults to `npm root -g`.
+PRETTIER_NODE_PATH = os.getenv("PRETTIER_NODE_PATH", "")
+# Records each file's hash after formatting, to skip files that haven't changed.
+FORMAT_CACHE_DB = os.getenv(
+    "FORMAT_CACHE_DB", os.path.join(DATA_DIR, ".cache", "format.db")
+)
+PRETTIER_MAX_RESTARTS = int(os.getenv("PRETTIER_MAX_RESTARTS", "3"))
+# Seconds to wait for the daemon to start or answer before it is killed.
+PRETTIER_TIMEOUT = float(os.getenv("PRETTIER_TIMEOUT", "60"))
+
+
+class DaemonError(Exception):
+    """Raised when the Prettier daemon can't be started or keeps crashing."""
+
+
+def expand(files):
+    """
+    Turns a path, a glob pattern or a list of either into a sorted list of
+    absolute file paths.
+    """
+    if isinstance(files, str):
+        files = [files]
+    paths = set()
+    for pattern in files:
+        if glob.has_magic(pattern):
+            matches = glob.glob(pattern, recursive=True)
+            paths.update(path for path in matches if os.path.isfile(path))
+        else:
+            paths.add(pattern)
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+@lru_cache(maxsize=None)
+def node_path():
+    """Directory holding globally installed Node packages (`npm root -g`)."""
+    if PRETTIER_NODE_PATH:
+        return PRETTIER_NODE_PATH
+    try:
+        return subprocess.run(
+            ["npm", "root", "-g"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class PrettierDaemon:
+    """
+    A long-lived `node prettier_daemon.js` process, restarted if it dies.
+
+    Requests are newline-delimited JSON over its stdin/stdout; one request
+    formats a whole batch of files, so Node startup and loading Prettier are
+    paid once per process instead of once per file. A daemon that doesn't
+    answer within `timeout` seconds, or answers out of turn, is killed. Its
+    stderr goes to the server's own.
+    """
+
+    def __init__(
+        self,
+        version=PRETTIER_VERSION,
+        max_restarts=PRETTIER_MAX_RESTARTS,
+        timeout=PRETTIER_TIMEOUT,
+    ):
+        self.version = version
+        self.max_restarts = max_restarts
+        self.timeout = timeout
+        self.restarts = 0
+        self._process = None
+        self._buffer = b""
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        env = dict(os.environ, PRETTIER_VERSION=self.version)
+        if node_path():
+            env["NODE_PATH"] = os.pathsep.join(
+                filter(None, [node_path(), env.get("NODE_PATH", "")])
+            )
+        try:
+            self._process = subprocess.Popen(
+                ["node", PRETTIER_DAEMON],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=env,
+            )
+        except OSError as e:
+            raise DaemonError(f"Could not start node: {e}")
+        self._buffer = b""
+
+        try:
+            line = self._readline()
+        except TimeoutError:
+            line = b""
+        if not line:
+            self._kill()
+            raise DaemonError("Prettier daemon failed to start (see its stderr)")
+        inc("prettier_daemon_starts_total")
+
+    def _readline(self):
+        """
+        Reads one line from the daemon's stdout; b"" if it exited. Raises
+        TimeoutError if no full line arrives within `timeout` seconds.
+        """
+        fd = self._process.stdout.fileno()
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while b"\n" not in self._buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise TimeoutError(f"no answer in {self.timeout:g}s")
+                chunk = os.read(fd, 1 << 16)
+                if not chunk:
+                    return b""
+                self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line
+
+    def _request(self, files: list):
+        self._next_id += 1
+        request = {"id": self._next_id, "files": files}
+        self._process.stdin.write(json.dumps(request).encode() + b"\n")
+        self._process.stdin.flush()
+        line = self._readline()
+        if not line:
+            raise BrokenPipeError("Prettier daemon exited")
+        response = json.loads(line)
+        if response.get("id") != request["id"]:
+            raise ValueError(f"Unexpected response: {line.decode().strip()}")
+        return response["results"]
+
+    def format(self, files: list):
+        """
+        Formats files in place in one round trip.
+
+        Returns:
+            list: One {"file", "changed"} or {"file", "error"} dict per file.
+        """
+        if not files:
+            return []
+        with self._lock:
+            for _ in range(self.max_restarts + 1):
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                try:
+                    return self._request(files)
+                except TimeoutError as e:
+                    # Likely stuck on this batch: don't wait on it again.
+                    self._kill()
+                    raise DaemonError(f"Prettier daemon hung: {e}")
+                except (BrokenPipeError, ValueError):
+                    # Exited, or out of step with our requests: start a new one.
+                    self._kill()
+                    self.restarts += 1
+            raise DaemonError("Prettier daemon keeps crashing")
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+            self._buffer = b""
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+                self._kill()
+
+
+class FormatCache:
+    """SQLite record of each file's hash right after it was last formatted."""
+
+    def __init__(self, path=FORMAT_CACHE_DB):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS formatted (
+                    path TEXT PRIMARY KEY,
+                    sha TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    formatted_at REAL NOT NULL
+                )
+            """
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, paths: list, version: str):
+        """Returns {path: sha} for the paths formatted with this version."""
+        with self._lock:
+            conn = self._db()
+            return {
+                path: sha
+                for path in paths
+                for (sha,) in conn.execute(
+                    "SELECT sha FROM formatted WHERE path = ? AND version = ?",
+                    (path, version),
+                )
+            }
+
+    def put_many(self, hashes: dict, version: str):
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.executemany(
+                "INSERT OR REPLACE INTO formatted VALUES (?, ?, ?, ?)",
+                [(path, sha, version, now) for path, sha in hashes.items()],
+            )
+            conn.commit()
+
+
+def format_files(files, daemon=None, cache=None):
+    """
+    Formats files (a path, a glob or a list of either) with Prettier.
+
+    Files whose content still matches the hash recorded after their last
+    formatting are skipped without a round trip to the daemon.
+
+    Returns:
+        dict: Lists of "formatted", "unchanged" and "skipped" files, and
+        {file: message} "errors".
+    """
+    daemon = daemon or prettier_daemon
+    cache = cache or format_cache
+    paths = expand(files)
+
+    current = {}
+    errors = {}
+    for path in paths:
+        try:
+            current[path] = file_hash(path)
+        except OSError as e:
+            errors[path] = str(e)
+    recorded = cache.get_many(list(current), daemon.version)
+    skipped = [path for path, sha in current.items() if recorded.get(path) == sha]
+    todo = [path for path in current if recorded.get(path) != current[path]]
+    inc("format_files_total", len(skipped), result="skipped")
+
+    formatted, unchanged, hashes = [], [], {}
+    with span("format"):
+        results = daemon.format(todo)
+    for result in results:
+        path = result["file"]
+        if "error" in result:
+            errors[path] = result["error"]
+            continue
+        (formatted if result["changed"] else unchanged).append(path)
+        hashes[path] = current[path] if not result["changed"] else file_hash(path)
+    cache.put_many(hashes, daemon.version)
+    inc("format_files_total", len(formatted), result="formatted")
+    inc("format_files_total", len(unchanged), result="unchanged")
+
+    return {
+        "formatted": formatted,
+        "unchanged": unchanged,
+        "skipped": skipped,
+        "errors": errors,
+    }
+
+
+prettier_daemon = PrettierDaemon()
+format_cache = FormatCache()
@@ -0,0 +1,47 @@
+# Multi-process serving: gunicorn -c gunicorn.conf.py main:app
+#
+# The app (and whatever `main.prefork` loads) is imported once in the master
+# and shared copy-on-write by the forked uvicorn workers, which run on uvloop
+# and httptools; the local model is loaded in each worker (`main.postfork`).
+# Caches that must be shared between workers live on disk under
+# $DATA_DIR/.cache (parse cache, memo, jobs, embeddings, OCR results), while
+# the /metrics and /cache/stats counters are per worker.
+
+import gc
+import multiprocessing
+import os
+
+########## CONST ##########
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Split the cores between workers instead of giving every worker a full set
+# of CPU-pool processes and torch threads. Set before the app is imported.
+_share = str(max(1, multiprocessing.cpu_count() // workers))
+os.environ.setdefault("CPU_WORKERS", _share)
+os.environ.setdefault("LOCAL_LLM_THREADS", _share)
+os.environ.setdefault("OCR_WORKERS", "1")
+
+
+def when_ready(server):
+    """Loads shared state in the master, then freezes it before any fork."""
+    import main
+
+    main.prefork()
+    # Objects created so far are never collected, so the collector doesn't
+    # touch (and copy) their pages in the workers.
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded app state; forking %s workers", workers)
+
+
+def post_worker_init(worker):
+    """Loads what can't be shared across a fork, such as the torch model."""
+    import main
+
+    main.postfork()
@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(DATA_DIR, ".cache", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Workers also poll, to pick up jobs queued by other server processes.
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 60 * 60)))
+# A job whose runner died this many times is failed rather than requeued again.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "256"))
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while `max_queued` jobs are waiting."""
+
+
+def job_key(task: str, force: bool):
+    """Identifies identical submissions: same task text (up to spacing) and mode."""
+    text = " ".join(task.split())
+    return hashlib.sha256(f"{int(force)}\0{text}".encode()).hexdigest()
+
+
+class JobStore:
+    """
+    SQLite-backed queue of `/run` tasks.
+
+    Writes that must not race (submitting with coalescing, claiming the next
+    job) run inside `BEGIN IMMEDIATE`, so several worker processes can share
+    one database.
+    """
+
+    def __init__(
+        self, path=JOBS_DB, max_attempts=JOB_MAX_ATTEMPTS, max_queued=MAX_QUEUED_JOBS
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self._conn = None
+        self._lock = threading.Lock()
+        # Called by `submit` so this process's workers don't wait for a poll.
+        self.wakeup = None
+        self.host = socket.gethostname()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    force INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    source TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    owner TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+        return self._conn
+
+    def submit(self, task: str, force: bool = False):
+        """
+        Queues a task, or joins the queued/running job for an identical one.
+        Raises `QueueFull` if a new job would exceed `max_queued` waiting jobs.
+
+        Returns:
+            dict: {"job_id", "status", "coalesced"}
+        """
+        key = job_key(task, force)
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, status FROM jobs WHERE key = ? "
+                    "AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1",
+                    (key,),
+                ).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return {
+                        "job_id": row["id"],
+                        "status": row["status"],
+                        "coalesced": True,
+                    }
+
+                (queued,) = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                ).fetchone()
+                if queued >= self.max_queued:
+                    raise QueueFull(f"{queued} jobs already queued")
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, key, task, force, status, created_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?)",
+                    (job_id, key, task, int(force), time.time()),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if self.wakeup is not None:
+            self.wakeup()
+        return {"job_id": job_id, "status": "queued", "coalesced": False}
+
+    def claim(self):
+        """Marks the oldest queued job as running and returns it, or None."""
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, task, force FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, "
+                        "owner = ?, attempts = attempts + 1 WHERE id = ?",
+                        (time.time(), f"{self.host}:{os.getpid()}", row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row else None
+
+    def finish(self, job_id: str, status: str, result=None, error=None, source=None):
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, source = ?, "
+                "finished_at = ? WHERE id = ?",
+                (
+                    status,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    source,
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def requeue(self, job_id: str):
+        """Puts a job that was interrupted back in the queue."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL "
+                "WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+
+    def _orphaned(self, owner: str):
+        """True if the process that claimed a job on this host is gone."""
+        host, _, pid = (owner or "").rpartition(":")
+        if host != self.host:
+            return not owner
+        if not pid.isdigit() or int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def recover(self, retention: float = JOB_RETENTION):
+        """
+        Requeues jobs left running by a process on this host that has died
+        (e.g. before a restart), failing those already claimed `max_attempts`
+        times, and drops finished jobs older than `retention` seconds.
+        Returns the number requeued.
+        """
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, owner, attempts FROM jobs WHERE status = 'running'"
+                ).fetchall()
+                orphans = [row for row in rows if self._orphaned(row["owner"])]
+                exhausted = [
+                    (
+                        f"Gave up after {row['attempts']} attempts",
+                        time.time(),
+                        row["id"],
+                    )
+                    for row in orphans
+                    if row["attempts"] >= self.max_attempts
+                ]
+                requeued = [
+                    (row["id"],)
+                    for row in orphans
+                    if row["attempts"] < self.max_attempts
+                ]
+                conn.executemany(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                    "WHERE id = ?",
+                    exhausted,
+                )
+                conn.executemany(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL, "
+                    "owner = NULL WHERE id = ?",
+                    requeued,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') "
+                "AND finished_at < ?",
+                (time.time() - retention,),
+            )
+        return len(requeued)
+
+    def get(self, job_id: str):
+        """Returns a job's status, result and timings, or None."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "task": row["task"],
+            "force": bool(row["force"]),
+            "status": row["status"],
+            "source": row["source"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["started_at"]:
+            job["queued_seconds"] = round(row["started_at"] - row["created_at"], 6)
+        if row["started_at"] and row["finished_at"]:
+            job["run_seconds"] = round(row["finished_at"] - row["started_at"], 6)
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+
+class JobWorkers:
+    """
+    A fixed number of asyncio workers running jobs from a `JobStore`.
+
+    Parameters:
+    - store (JobStore): Queue to take jobs from.
+    - run_task: Coroutine function `run_task(task, force) -> (result, source)`.
+    - workers (int): How many jobs run at once in this process.
+    """
+
+    def __init__(self, store: JobStore, run_task, workers: int = JOB_WORKERS):
+        self.store = store
+        self.run_task = run_task
+        self.workers = workers
+        self._tasks = []
+        self._event = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self.store.wakeup = lambda: loop.call_soon_threadsafe(self._event.set)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancels the workers; the jobs they were running go back in the queue."""
+        self.store.wakeup = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            self._event.clear()
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._event.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                result, source = await self.run_task(job["task"], bool(job["force"]))
+            except asyncio.CancelledError:
+                await asyncio.shield(asyncio.to_thread(self.store.requeue, job["id"]))
+                raise
+            except Exception as e:
+                await asyncio.to_thread(
+                    self.store.finish, job["id"], "failed", error=str(e)
+                )
+                continue
+
+            if isinstance(result, dict) and "error" in result:
+                status, error = "failed", str(result["error"])
+            else:
+                status, error = "done", None
+            await asyncio.to_thread(
+                self.store.finish, job["id"], status, result, error, source
+            )
+
+
+job_store = JobStore()
@@ -1,15 +1,24 @@
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
 
-# Load FLAN-T5 small model and tokenizer
-model_name = "google/flan-t5-small"
-tokenizer = T5Tokenizer.from_pretrained(model_name)
-model = T5ForConditionalGeneration.from_pretrained(model_name)
+from router import REQUIRED_PARAMS, extract_params
 
+########## CONST ##########
+model_name = os.getenv("LOCAL_LLM_MODEL", "google/flan-t5-small")
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", str(os.cpu_count() or 1)))
+LOCAL_LLM_QUANTIZE = os.getenv("LOCAL_LLM_QUANTIZE", "1") == "1"
+# Requests arriving within this window are scored in one forward pass.
+LOCAL_LLM_BATCH_WINDOW = float(os.getenv("LOCAL_LLM_BATCH_WINDOW_MS", "5")) / 1000
+LOCAL_LLM_MAX_BATCH = int(os.getenv("LOCAL_LLM_MAX_BATCH", "16"))
+ACTIONS = list(REQUIRED_PARAMS)
 
-def generate_response(task: str) -> str:
-    # Generate a response using FLAN-T5
-
-    prompt = f"""
+# Instructions for `generate_response`, built once
+GENERATE_PROMPT = """
     You are an intelligent task parser for an automation system. Given a task description in plain English,
     extract the corresponding action and parameters.
 
@@ -68,14 +77,214 @@ def generate_response(task: str) -> str:
     Respond strictly in JSON format.
     """
 
+_GENERATE_HEAD, _GENERATE_TAIL = GENERATE_PROMPT.split("{task}")
+
+# The local parser only has to pick an action; parameters come from the
+# router's extractor. The fixed instructions come first so the task is last.
+CLASSIFY_PREFIX = (
+    "Classify the automation task into one of these actions: "
+    + ", ".join(ACTIONS)
+    + ".\n\nTask: "
+)
+CLASSIFY_SUFFIX = "\nAction:"
+
+
+@lru_cache(maxsize=2)
+def get_model(quantize: bool = LOCAL_LLM_QUANTIZE):
+    """
+    Loads the FLAN-T5 tokenizer and model on first use.
+
+    With `quantize`, Linear layers are converted to dynamic int8, which is
+    what makes CPU inference fast; torch uses LOCAL_LLM_THREADS threads.
+    """
+    import torch
+    from transformers import T5Tokenizer, T5ForConditionalGeneration
+
+    torch.set_num_threads(LOCAL_LLM_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # only allowed before the first parallel op
+        pass
+
+    tokenizer = T5Tokenizer.from_pretrained(model_name)
+    model = T5ForConditionalGeneration.from_pretrained(model_name).eval()
+    if quantize:
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return tokenizer, model
+
+
+def generate_response(
+    task: str, num_beams: int = 4, max_length: int = 1024, quantize: bool = False
+) -> str:
+    """
+    Generates a free-form JSON answer for a task with FLAN-T5.
+
+    The defaults are the original settings; `LocalParser` is the fast path.
+    """
+    import torch
+
+    tokenizer, model = get_model(quantize)
+    prompt = f"{_GENERATE_HEAD}{task}{_GENERATE_TAIL}"
+
     input_ids = tokenizer.encode(prompt, return_tensors="pt")
-    output_ids = model.generate(input_ids, max_length=1024, num_beams=4)
+    with torch.inference_mode():
+        output_ids = model.generate(
+            input_ids, max_length=max_length, num_beams=num_beams
+        )
     response = tokenizer.decode(output_ids[0], skip_special_tokens=True)
     return response
 
 
+class LocalParser:
+    """
+    Parses tasks with a local FLAN-T5 model instead of the OpenAI API.
+
+    Decoding is constrained to the known actions: each task is encoded once
+    and that encoder output is shared to score every action label, so a
+    request costs one encoder pass plus a few-token decoder pass per action.
+    Concurrent requests are collected for up to LOCAL_LLM_BATCH_WINDOW and
+    scored as one batch.
+    """
+
+    def __init__(
+        self,
+        quantize=LOCAL_LLM_QUANTIZE,
+        max_batch=LOCAL_LLM_MAX_BATCH,
+        window=LOCAL_LLM_BATCH_WINDOW,
+    ):
+        self.quantize = quantize
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._prefix_ids = None
+        self._labels = None
+
+    def _prepare(self):
+        """Tokenizes the fixed prefix and the action labels once."""
+        if self._labels is None:
+            tokenizer, _ = get_model(self.quantize)
+            self._prefix_ids = tokenizer(
+                CLASSIFY_PREFIX, add_special_tokens=False
+            ).input_ids
+            self._labels = tokenizer(
+                ACTIONS, padding=True, return_tensors="pt"
+            ).input_ids
+        return self._prefix_ids, self._labels
+
+    def classify(self, tasks: list):
+        """Returns (action, probability) for each task, scored in one batch."""
+        import torch
+
+        tokenizer, model = get_model(self.quantize)
+        prefix_ids, labels = self._prepare()
+        pad = tokenizer.pad_token_id
+
+        rows = [
+            prefix_ids + tokenizer(task + CLASSIFY_SUFFIX).input_ids for task in tasks
+        ]
+        width = max(len(row) for row in rows)
+        input_ids = torch.tensor([row + [pad] * (width - len(row)) for row in rows])
+        attention_mask = (input_ids != pad).long()
+
+        n = len(ACTIONS)
+        with torch.inference_mode():
+            encoded = model.get_encoder()(
+                input_ids=input_ids, attention_mask=attention_mask
+            ).last_hidden_state
+            # Every task is paired with every action label, reusing its encoding.
+            hidden = encoded.repeat_interleave(n, dim=0)
+            mask = attention_mask.repeat_interleave(n, dim=0)
+            targets = labels.repeat(len(tasks), 1)
+            logits = model(
+                encoder_outputs=(hidden,),
+                attention_mask=mask,
+                decoder_input_ids=model._shift_right(targets),
+            ).logits
+
+            log_probs = logits.log_softmax(-1).gather(-1, targets.unsqueeze(-1))
+            token_mask = (targets != pad).float()
+            scores = (log_probs.squeeze(-1) * token_mask).sum(-1) / token_mask.sum(-1)
+            probs = scores.view(len(tasks), n).softmax(-1)
+
+        best = probs.argmax(-1).tolist()
+        return [
+            (ACTIONS[i], round(float(probs[row, i]), 3)) for row, i in enumerate(best)
+        ]
+
+    def _run(self):
+        while True:
+            try:
+                self._run_batch()
+            except Exception as e:  # never let the batching thread die
+                print(f"Local parser batch failed: {e}")
+
+    def _run_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        # Futures of callers that went away (e.g. a cancelled request) are
+        # dropped; the rest can no longer be cancelled.
+        batch = [
+            (task, future)
+            for task, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        try:
+            results = self.classify([task for task, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def submit(self, task: str):
+        """Queues a task for the next batch; returns a Future of (action, prob)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((task, future))
+        return future
+
+    @staticmethod
+    def _result(task: str, action: str, probability: float):
+        params = extract_params(action, task)
+        missing = [key for key in REQUIRED_PARAMS[action] if key not in params]
+        if missing:
+            return {
+                "error": f"Local parser found no {', '.join(missing)} for {action}."
+            }
+        return {"action": action, "parameters": params, "confidence": probability}
+
+    def parse(self, task: str):
+        """Parses a task into {"action", "parameters"} like `parse_task_with_llm`."""
+        return self._result(task, *self.submit(task).result())
+
+    async def parse_async(self, task: str):
+        """Async variant of `parse` that doesn't block the event loop."""
+        return self._result(task, *await asyncio.wrap_future(self.submit(task)))
+
+
+local_parser = LocalParser()
+
+
 if __name__ == "__main__":
     # Example usage
-    prompt = "What is the capital of France?"
-    response = generate_response(prompt)
-    print(response)
+    task = "Count the Wednesdays in /data/dates.txt and write the count to /data/n.txt"
+    print(local_parser.parse(task))
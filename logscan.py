@@ -0,0 +1,103 @@
+import hashlib
+import heapq
+import json
+import os
+import time
+from operator import itemgetter
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+LOG_INDEX_DIR = os.getenv(
+    "LOG_INDEX_DIR", os.path.join(DATA_DIR, ".cache", "log-index")
+)
+# How long indexed mtimes are trusted before every file is stat'ed again.
+LOG_INDEX_MAX_AGE = float(os.getenv("LOG_INDEX_MAX_AGE", "60"))
+FIRST_LINE_CHUNK = 4096
+FIRST_LINE_LIMIT = 1 << 16
+
+
+def scan_mtimes(directory: str, suffix: str = ".log"):
+    """Returns {name: mtime} for the matching files, using scandir's cached stats."""
+    mtimes = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffix) and entry.is_file():
+                mtimes[entry.name] = entry.stat().st_mtime
+    return mtimes
+
+
+def _index_path(directory: str, suffix: str):
+    key = hashlib.sha1(f"{os.path.abspath(directory)}\0{suffix}".encode()).hexdigest()
+    # Kept outside the directory: writing it there would bump the dir mtime.
+    return os.path.join(LOG_INDEX_DIR, f"{key}.json")
+
+
+def indexed_mtimes(directory: str, suffix: str = ".log", max_age=LOG_INDEX_MAX_AGE):
+    """
+    Returns {name: mtime} from a persisted index, refreshing it incrementally.
+
+    While the index is younger than `max_age`, an unchanged directory mtime
+    means no files were added or removed and the index is used as is; a
+    changed one only costs a listing plus a stat of the new names. Older
+    indexes are rebuilt with a full scan so appended-to files are picked up.
+    """
+    path = _index_path(directory, suffix)
+    dir_mtime_ns = os.stat(directory).st_mtime_ns
+    now = time.time()
+
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+
+    if index is None or now - index["scanned_at"] >= max_age:
+        index = {"scanned_at": now, "mtimes": scan_mtimes(directory, suffix)}
+    elif index["dir_mtime_ns"] == dir_mtime_ns:
+        return index["mtimes"]
+    else:
+        old = index["mtimes"]
+        mtimes = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix):
+                    continue
+                if entry.name in old:
+                    mtimes[entry.name] = old[entry.name]
+                elif entry.is_file():
+                    mtimes[entry.name] = entry.stat().st_mtime
+        index["mtimes"] = mtimes
+
+    index["dir_mtime_ns"] = dir_mtime_ns
+    try:
+        os.makedirs(LOG_INDEX_DIR, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Could not persist log index: {e}")
+    return index["mtimes"]
+
+
+def recent_files(directory: str, n: int = 10, suffix=".log", use_index=False):
+    """Returns the `n` most recently modified matching file names, newest first."""
+    if use_index:
+        mtimes = indexed_mtimes(directory, suffix)
+    else:
+        mtimes = scan_mtimes(directory, suffix)
+    return [name for name, _ in heapq.nlargest(n, mtimes.items(), key=itemgetter(1))]
+
+
+def read_first_line(path: str, chunk=FIRST_LINE_CHUNK, limit=FIRST_LINE_LIMIT):
+    """Reads a file's first line with small unbuffered reads, up to `limit` bytes."""
+    data = b""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        while b"\n" not in data and len(data) < limit:
+            block = os.read(fd, chunk)
+            if not block:
+                break
+            data += block
+    finally:
+        os.close(fd)
+    return data.split(b"\n", 1)[0].decode("utf-8", errors="replace").strip()
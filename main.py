@@ -1,92 +1,356 @@
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI, HTTPException
-import openai
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 import os
 
 # Importing functions
 from phase_A import (
-    install_and_run_script,
-    format_markdown,
+    install_and_run_script_async,
+    format_markdown_async,
     count_wednesdays,
     sort_contacts,
     extract_recent_logs,
     extract_markdown_titles,
-    extract_email_sender,
+    extract_email_sender_async,
     extract_credit_card,
-    find_similar_comments,
+    find_similar_comments_async,
     calculate_sales,
+    preload,
 )
-from prompt import parse_task_with_llm
+from planner import parse_plan, run_plan, step_paths
+from prompt import TASK_PARSER_BACKEND, get_async_client, parse_batcher
+from parse_cache import parse_cache
+from memo import memo_store
+import executor
+import metrics
+import jobs
+from jobs import JobWorkers, job_store
+from ocr import ocr_pool
+from fileserve import file_response, resolve_path
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI API key
+# The OpenAI key is read by the shared clients in `prompt`
 AIPROXY_TOKEN = os.getenv("AIPROXY_TOKEN")
 if not AIPROXY_TOKEN:
     raise ValueError("AIPROXY_TOKEN is not set in the environment variables.")
-openai.api_key = AIPROXY_TOKEN
+
+# Comma-separated actions (or "all") whose modules are imported at startup
+WARM_ACTIONS = os.getenv("WARM_ACTIONS", "")
+
+
+def _warm_actions():
+    return [action.strip() for action in WARM_ACTIONS.split(",") if action.strip()]
+
+
+def prefork():
+    """
+    Loads state that server workers can share copy-on-write, before a
+    pre-forking server (see gunicorn.conf.py) starts them: WARM_ACTIONS
+    modules, the parse cache's memory tier and the embedding cache's key
+    index. Clients, connections, worker pools and the local model (see
+    `postfork`) are left for each worker to open.
+    """
+    preload(_warm_actions())
+    parse_cache.warm()
+    if "embeddings" in sys.modules:
+        from embeddings import get_backend, get_store
+
+        store = get_store(get_backend().model)
+        if store is not None:
+            store.get_many([])
+
+
+def postfork():
+    """
+    Loads per-worker state in a freshly forked server worker: the local
+    FLAN-T5 model when it parses tasks, since torch's thread pool doesn't
+    survive a fork and a model loaded in the master can hang its workers.
+    """
+    if TASK_PARSER_BACKEND == "local":
+        from llm import get_model
+
+        get_model()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the shared LLM client, preloads WARM_ACTIONS and starts the job
+    workers (requeueing jobs interrupted by a restart) on startup; stops the
+    workers and releases the client, the CPU and OCR worker pools and the
+    Prettier daemon when the server stops.
+    """
+    client = get_async_client()
+    actions = _warm_actions()
+    if actions:
+        await asyncio.to_thread(preload, actions)
+    requeued = await asyncio.to_thread(job_store.recover)
+    if requeued:
+        print(f"Requeued {requeued} interrupted jobs")
+    job_workers.start()
+    yield
+    await job_workers.stop()
+    await client.close()
+    executor.shutdown()
+    ocr_pool.shutdown()
+    if "formatter" in sys.modules:
+        sys.modules["formatter"].prettier_daemon.close()
+
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+admission = executor.AdmissionController()
 
 # Constants
-DATA_DIR = "/data"
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+
+
+async def instrument(request: Request, call_next):
+    """
+    Times every request by route. A request sending `X-Server-Timing: 1` (or
+    any request with SERVER_TIMING=1) gets its stage timings back in a
+    `Server-Timing` header.
+    """
+    wanted = metrics.SERVER_TIMING or request.headers.get("x-server-timing") == "1"
+    timings, token = metrics.collect_timings(wanted)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.stop_timings(token)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_seconds", elapsed, path=path)
+    if timings is not None:
+        timings.append(("total", "", elapsed))
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+
+if metrics.METRICS_ENABLED:
+    app.middleware("http")(instrument)
+
+
+def _cache_counters():
+    """Exports the parse cache, batching and memo counters to /metrics."""
+    stats = parse_cache.stats()
+    for tier in ("memory_hits", "disk_hits", "misses"):
+        yield "parse_cache_lookups_total", {"result": tier}, stats[tier]
+    for name, value in parse_batcher.stats.items():
+        yield f"parse_batch_{name}_total", {}, value
+    for name, value in memo_store.counters.items():
+        yield "memo_lookups_total", {"result": name}, value
+
+
+metrics.register_collector(_cache_counters)
+
+
+def _file_sizes(paths: list):
+    """Total size of the regular files among paths (directories count as 0)."""
+    total = 0
+    for path in paths:
+        try:
+            if os.path.isfile(path):
+                total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
 
 
 @app.get("/read")
 def read(path: str):
     """Reads a file's contents from the /data directory."""
-    full_path = os.path.join(os.getcwd(), DATA_DIR, path.lstrip("/"))
-    if not os.path.exists(full_path):
-        raise HTTPException(status_code=404, detail="File not found")
+    full_path = resolve_path(path)
 
     with open(full_path, "r", encoding="utf-8") as f:
         return {"content": f.read()}
 
 
+@app.get("/read/raw")
+def read_raw(path: str, request: Request):
+    """Streams a file from /data with Range, ETag/If-None-Match and gzip support."""
+    return file_response(resolve_path(path), request)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Reports counters of the task parse cache, parse batching and output memo.
+    Counters are kept per server worker; `worker_pid` says which one answered.
+    """
+    return {
+        **parse_cache.stats(),
+        "batching": dict(parse_batcher.stats),
+        "memo": dict(memo_store.counters),
+        "worker_pid": os.getpid(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """
+    Prometheus metrics: stage latency histograms, cache, LLM, I/O counters.
+    Like /cache/stats, these cover only the server worker that answered.
+    """
+    return PlainTextResponse(
+        f"# Metrics of worker process {os.getpid()} only\n"
+        + metrics.registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+async def execute(action: str, params: dict, force: bool = False):
+    """
+    Runs a parsed action without blocking the event loop.
+
+    Memoized actions return their recorded result while their inputs and
+    output are unchanged, unless `force` is set.
+    """
+    task_mapping = {
+        "install_and_run": lambda: install_and_run_script_async(params["email"]),
+        "format_markdown": lambda: format_markdown_async(params["file"]),
+        "count_wednesdays": lambda: asyncio.to_thread(
+            count_wednesdays,
+            params["file"],
+            params["output"],
+            params.get("weekday", "wednesday"),
+            force=force,
+        ),
+        "sort_contacts": lambda: asyncio.to_thread(
+            sort_contacts,
+            params["file"],
+            params["output"],
+            tuple(params.get("keys") or ("last_name", "first_name")),
+            force=force,
+        ),
+        "extract_recent_logs": lambda: asyncio.to_thread(
+            extract_recent_logs,
+            params["dir"],
+            params["output"],
+            params.get("count", 10),
+        ),
+        "extract_markdown_titles": lambda: asyncio.to_thread(
+            extract_markdown_titles, params["dir"], params["output"]
+        ),
+        "extract_email_sender": lambda: extract_email_sender_async(
+            params["file"], params["output"]
+        ),
+        "extract_credit_card": lambda: asyncio.to_thread(
+            extract_credit_card, params["file"], params["output"]
+        ),
+        "find_similar_comments": lambda: find_similar_comments_async(
+            params["file"], params["output"], force=force
+        ),
+        "calculate_sales": lambda: asyncio.to_thread(
+            calculate_sales,
+            params["db_file"],
+            params["output"],
+            params.get("ticket_type", "Gold"),
+            force=force,
+        ),
+    }
+
+    if action in task_mapping:
+        if not metrics.METRICS_ENABLED:
+            return await task_mapping[action]()
+
+        inputs, outputs = step_paths(action, params)
+        metrics.inc("bytes_read_total", _file_sizes(inputs), action=action)
+        result = await task_mapping[action]()
+        metrics.inc("bytes_written_total", _file_sizes(outputs), action=action)
+        return result
+    return {"error": "Unknown task"}
+
+
+async def run_task(task: str, force: bool = False):
+    """
+    Parses and executes a task, as a single action or a plan of steps.
+
+    Returns:
+        tuple: (result, source) where source says how the task was parsed.
+    """
+    with metrics.span("parse"):
+        steps, source = await parse_plan(task)
+    if len(steps) == 1:
+        return await execute(*steps[0], force=force), source
+
+    start = time.perf_counter()
+    reports = await run_plan(
+        steps,
+        lambda action, params: execute(action, params, force=force),
+        skip_fresh=not force,
+    )
+    return {"steps": reports, "seconds": round(time.perf_counter() - start, 6)}, source
+
+
+job_workers = JobWorkers(job_store, run_task)
+
+
 @app.post("/run")
-def run(task: str):
-    """Parses and executes a given task using GPT-4o-Mini."""
+async def run(
+    task: str,
+    response: Response,
+    force: bool = False,
+    run_async: bool = Query(False, alias="async"),
+):
+    """
+    Parses (locally or with GPT-4o-Mini) and executes a given task.
+
+    `force=true` reruns steps even if their memoized outputs are up to date.
+    `async=1` queues the task and returns its job id at once (202); poll
+    `/jobs/{job_id}` for the result. Submitting a task identical to one still
+    queued or running returns that job instead.
+    """
+    if run_async:
+        try:
+            job = await asyncio.to_thread(job_store.submit, task, force)
+        except jobs.QueueFull:
+            raise HTTPException(status_code=429, detail="Too many jobs queued")
+        response.status_code = 202
+        return job
+
     try:
-        action, params = parse_task_with_llm(task)
-
-        task_mapping = {
-            "install_and_run": lambda: install_and_run_script(params["email"]),
-            "format_markdown": lambda: format_markdown(params["file"]),
-            "count_wednesdays": lambda: count_wednesdays(
-                params["file"], params["output"]
-            ),
-            "sort_contacts": lambda: sort_contacts(params["file"], params["output"]),
-            "extract_recent_logs": lambda: extract_recent_logs(
-                params["dir"], params["output"]
-            ),
-            "extract_markdown_titles": lambda: extract_markdown_titles(
-                params["dir"], params["output"]
-            ),
-            "extract_email_sender": lambda: extract_email_sender(
-                params["file"], params["output"]
-            ),
-            "extract_credit_card": lambda: extract_credit_card(
-                params["file"], params["output"]
-            ),
-            "find_similar_comments": lambda: find_similar_comments(
-                params["file"], params["output"]
-            ),
-            "calculate_sales": lambda: calculate_sales(
-                params["db_file"], params["output"]
-            ),
-        }
-
-        if action in task_mapping:
-            return task_mapping[action]()
-        return {"error": "Unknown task"}
+        async with admission.slot():
+            result, source = await run_task(task, force)
+            response.headers["X-Task-Source"] = source
+            return result
 
+    except executor.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many tasks queued")
     except Exception as e:
         print(e)
         return {"error": str(e)}
 
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Reports a queued task's status, result or error, and timings."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--warm",
+        default=WARM_ACTIONS,
+        help='Comma-separated actions to preload at startup, or "all"',
+    )
+    args = parser.parse_args()
+    WARM_ACTIONS = args.warm
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
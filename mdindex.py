@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+MD_MANIFEST_DIR = os.getenv(
+    "MD_MANIFEST_DIR", os.path.join(DATA_DIR, ".cache", "md-manifest")
+)
+MD_INDEX_WORKERS = int(os.getenv("MD_INDEX_WORKERS", "8"))
+
+
+def walk_markdown(root: str, suffix: str = ".md"):
+    """Returns {relative path: (mtime_ns, size)} for every Markdown file under root."""
+    files = {}
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffix) and entry.is_file():
+                    st = entry.stat()
+                    rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    files[rel] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def read_title(path: str):
+    """Returns the text of the first H1 line in a Markdown file, or None."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.startswith("# "):
+                return line[2:].strip()
+    return None
+
+
+def _manifest_path(root: str):
+    key = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()
+    return os.path.join(MD_MANIFEST_DIR, f"{key}.json")
+
+
+def index_titles(root: str, workers: int = MD_INDEX_WORKERS):
+    """
+    Indexes the H1 titles of all Markdown files under root, recursively.
+
+    A manifest of (mtime, size, title) per file is persisted between runs, so
+    only files that are new or changed are reopened; those are read in
+    parallel on a thread pool.
+
+    Returns:
+        tuple: ({relative path: title}, number of files re-read)
+    """
+    manifest_path = _manifest_path(root)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    current = walk_markdown(root)
+    changed = [
+        rel
+        for rel, stat in current.items()
+        if rel not in manifest or tuple(manifest[rel][:2]) != stat
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        titles = pool.map(read_title, (os.path.join(root, rel) for rel in changed))
+        for rel, title in zip(changed, titles):
+            manifest[rel] = [*current[rel], title]
+
+    manifest = {rel: manifest[rel] for rel in current}
+    try:
+        os.makedirs(MD_MANIFEST_DIR, exist_ok=True)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+    except OSError as e:
+        print(f"Could not persist Markdown manifest: {e}")
+
+    index = {
+        rel: entry[2] for rel, entry in sorted(manifest.items()) if entry[2] is not None
+    }
+    return index, len(changed)
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+MEMO_DB = os.getenv("MEMO_DB", os.path.join(DATA_DIR, ".cache", "memo.db"))
+MEMO_MAX_ENTRIES = int(os.getenv("MEMO_MAX_ENTRIES", "512"))
+# Fingerprint inputs by content hash instead of (inode, mtime, size).
+MEMO_HASH_INPUTS = os.getenv("MEMO_HASH_INPUTS", "0") == "1"
+
+
+def file_hash(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(st):
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def fingerprint(path: str, hash_contents: bool = MEMO_HASH_INPUTS, exclude=()):
+    """
+    Fingerprint of an input file or directory tree; None if it is missing.
+    Paths in `exclude` (e.g. the task's own outputs) are left out of a tree.
+    """
+    try:
+        if not os.path.isdir(path):
+            return file_hash(path) if hash_contents else _stat_key(os.stat(path))
+        exclude = set(exclude)
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in exclude)
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                if full in exclude:
+                    continue
+                key = file_hash(full) if hash_contents else _stat_key(os.stat(full))
+                digest.update(f"{os.path.relpath(full, path)}\0{key}\n".encode())
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+def _output_state(path: str):
+    """(stat key, content hash) of an output file, or None if it is missing."""
+    try:
+        return [_stat_key(os.stat(path)), file_hash(path)]
+    except OSError:
+        return None
+
+
+def _output_intact(path: str, recorded):
+    """Checks an output against its recorded state, hashing only if its stat moved."""
+    try:
+        if _stat_key(os.stat(path)) == recorded[0]:
+            return True
+        return file_hash(path) == recorded[1]
+    except OSError:
+        return False
+
+
+class MemoStore:
+    """
+    Bounded SQLite store of memoized task results, evicting least recently
+    used. If the database can't be opened or used, calls just aren't cached.
+    """
+
+    def __init__(self, path=MEMO_DB, max_entries=MEMO_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "forced": 0}
+
+    def _db(self):
+        """Opens the database on first use; returns None if it is unavailable."""
+        if self._conn is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS memo (
+                        key TEXT PRIMARY KEY,
+                        action TEXT NOT NULL,
+                        inputs TEXT NOT NULL,
+                        outputs TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """
+                )
+                self._conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Memoization disabled: {e}")
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    def get(self, key: str):
+        """Returns (inputs, outputs, result) for a key, or None."""
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT inputs, outputs, result FROM memo WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE memo SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Memo lookup failed: {e}")
+                return None
+            return json.loads(row[0]), json.loads(row[1]), json.loads(row[2])
+
+    def put(self, key: str, action: str, inputs, outputs, result):
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    action,
+                    json.dumps(inputs),
+                    json.dumps(outputs),
+                    json.dumps(result),
+                    time.time(),
+                ),
+            )
+            conn.execute(
+                "DELETE FROM memo WHERE key NOT IN "
+                "(SELECT key FROM memo ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM memo")
+                conn.commit()
+
+
+memo_store = MemoStore()
+
+
+def call_key(action: str, arguments: dict):
+    """Store key of an action called with the given (JSON-able) arguments."""
+    key_source = json.dumps([action, arguments], sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode()).hexdigest()
+
+
+def input_prints(input_paths: list, output_paths: list = ()):
+    """Fingerprints of a call's inputs, leaving its outputs out of directories."""
+    return [fingerprint(path, exclude=output_paths) for path in input_paths]
+
+
+def lookup(key: str, input_paths: list, output_paths: list):
+    """
+    Returns the recorded (inputs, outputs, result) of a call if every input
+    still has its recorded fingerprint and every output is as the call left
+    it; None otherwise.
+    """
+    entry = memo_store.get(key)
+    if entry is None:
+        return None
+    recorded_inputs, recorded_outputs, _ = entry
+    if input_prints(input_paths, output_paths) != recorded_inputs:
+        return None
+    if not all(
+        _output_intact(path, state)
+        for path, state in zip(output_paths, recorded_outputs)
+    ):
+        return None
+    return entry
+
+
+def record(key: str, action: str, prints: list, output_paths: list, result):
+    """Stores a call's result with its input fingerprints and output states."""
+    states = [_output_state(path) for path in output_paths]
+    if None in prints or None in states:
+        return
+    try:
+        memo_store.put(key, action, prints, states, result)
+    except (TypeError, ValueError, OSError, sqlite3.Error) as e:
+        print(f"Could not memoize {action}: {e}")
+
+
+def memoized(action: str, inputs=(), outputs=(), resolve=os.path.abspath):
+    """
+    Memoizes a task function on its arguments and its input files.
+
+    A call is served from the store when the same action was run with the
+    same arguments, every input still has its recorded fingerprint and every
+    output still matches what the earlier run wrote. Pass `force=True` to
+    always rerun.
+
+    Parameters:
+    - action (str): Name the results are stored under.
+    - inputs / outputs (tuple): Names of the arguments holding input and
+      output paths.
+    - resolve: Maps an argument value to an absolute path.
+    """
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def prepare(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            key = call_key(action, arguments)
+            input_paths = [resolve(arguments[name]) for name in inputs]
+            output_paths = [resolve(arguments[name]) for name in outputs]
+            return key, input_paths, output_paths
+
+        def cached(key, input_paths, output_paths, force):
+            if force:
+                memo_store.counters["forced"] += 1
+                return None
+            entry = lookup(key, input_paths, output_paths)
+            memo_store.counters["hits" if entry is not None else "misses"] += 1
+            return entry
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, force=False, **kwargs):
+                key, input_paths, output_paths = prepare(args, kwargs)
+                # SQLite and input hashing stay off the event loop.
+                entry = await asyncio.to_thread(
+                    cached, key, input_paths, output_paths, force
+                )
+                if entry is not None:
+                    return entry[2]
+                prints = await asyncio.to_thread(
+                    input_prints, input_paths, output_paths
+                )
+                result = await fn(*args, **kwargs)
+                await asyncio.to_thread(
+                    record, key, action, prints, output_paths, result
+                )
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, force=False, **kwargs):
+            key, input_paths, output_paths = prepare(args, kwargs)
+            entry = cached(key, input_paths, output_paths, force)
+            if entry is not None:
+                return entry[2]
+            # Fingerprint before running, so inputs changed mid-run don't match.
+            prints = input_prints(input_paths, output_paths)
+            result = fn(*args, **kwargs)
+            record(key, action, prints, output_paths, result)
+            return result
+
+        return wrapper
+
+    return decorator
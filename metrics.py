@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+########## CONST ##########
+# With metrics disabled, `timed` returns functions unchanged and the other
+# helpers return after a single flag check.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Send Server-Timing on every response, not only when a request asks for it.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)  # fmt: skip
+HELP = {
+    "task_stage_seconds": "Time spent in each stage of a task, by action.",
+    "http_request_seconds": "Request latency by route.",
+    "llm_requests_total": "Requests made to the LLM API.",
+    "llm_tokens_total": "Tokens reported by the LLM API.",
+    "bytes_read_total": "Bytes of input files read by tasks.",
+    "bytes_written_total": "Bytes of output files written by tasks.",
+    "subprocess_seconds_total": "Wall time spent in subprocesses, by command.",
+    "embedding_cache_lookups_total": "Embedding cache lookups by result.",
+    "format_files_total": "Files passed to Prettier, by result.",
+    "prettier_daemon_starts_total": "Starts of the Prettier daemon.",
+}
+
+_NULL_SPAN = nullcontext()
+# Stage timings of the current request, when it asked for Server-Timing.
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def _label_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Registry:
+    """Thread-safe counters and histograms rendered in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket, then the +Inf count and the sum.
+                histogram = [0] * (len(self.buckets) + 1) + [0.0]
+                self.histograms[key] = histogram
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += value
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: list(value) for key, value in self.histograms.items()}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                key = (name, _label_key(labels))
+                counters[key] = counters.get(key, 0) + value
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    le = _format_labels(labels, [("le", bound)])
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                cumulative += histogram[len(self.buckets)]
+                le = _format_labels(labels, [("le", "+Inf")])
+                lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def inc(name: str, value=1, **labels):
+    """Adds to a counter."""
+    if METRICS_ENABLED:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    """Records a histogram sample."""
+    if METRICS_ENABLED:
+        registry.observe(name, value, **labels)
+
+
+def register_collector(collect):
+    """
+    Adds a callable returning (name, labels, value) counters, read on every
+    render; used to export counters kept elsewhere (e.g. cache stats).
+    """
+    registry.collectors.append(collect)
+
+
+def record_usage(kind: str, response):
+    """Counts an LLM API response and the tokens it reports."""
+    if not METRICS_ENABLED:
+        return
+    registry.inc("llm_requests_total", kind=kind)
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    registry.inc("llm_tokens_total", prompt_tokens, kind=kind, direction="prompt")
+    if completion_tokens:
+        registry.inc(
+            "llm_tokens_total", completion_tokens, kind=kind, direction="completion"
+        )
+
+
+@contextmanager
+def _span(stage: str, action: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("task_stage_seconds", elapsed, stage=stage, action=action)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((stage, action, elapsed))
+
+
+def span(stage: str, action: str = ""):
+    """Context manager timing a stage into `task_stage_seconds`."""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _span(stage, action)
+
+
+def timed(stage: str, action: str = ""):
+    """Decorator timing every call of a (sync or async) function as a stage."""
+
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _span(stage, action):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(stage, action):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def collect_timings(enabled: bool):
+    """
+    Starts collecting the current request's stage timings if `enabled`.
+
+    Returns the list they are appended to (or None) and a token for
+    `stop_timings`. Threads started with `asyncio.to_thread` share the list.
+    """
+    timings = [] if enabled else None
+    return timings, _timings.set(timings)
+
+
+def stop_timings(token):
+    _timings.reset(token)
+
+
+def server_timing(timings: list):
+    """Formats collected timings as a Server-Timing header value."""
+    entries = []
+    for stage, action, elapsed in timings:
+        desc = f';desc="{action}"' if action else ""
+        entries.append(f"{stage}{desc};dur={elapsed * 1000:.2f}")
+    return ", ".join(entries)
@@ -0,0 +1,242 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from executor import mp_context
+from metrics import span
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "1024"))
+# Results are also kept on disk, shared by every server process.
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(DATA_DIR, ".cache", "ocr"))
+# Vertical slice of a card (as fractions of its height) holding the number.
+CARD_NUMBER_BAND = (0.3, 0.55)
+MAX_OCR_WIDTH = 1000
+MIN_TEXT_HEIGHT = 32
+TEXT_PADDING = 10
+DIGITS = "0123456789"
+LINE_CONFIG = f"--psm 7 -c tessedit_char_whitelist={DIGITS}"
+BLOCK_CONFIG = f"--psm 6 -c tessedit_char_whitelist={DIGITS}"
+
+_api = None  # per-worker tesserocr engine
+tesserocr = None
+
+
+def _otsu_threshold(histogram):
+    """Grey level that best separates the two classes of a bimodal histogram."""
+    total = sum(histogram)
+    weighted = sum(i * count for i, count in enumerate(histogram))
+    best, threshold, background, background_sum = 0.0, 127, 0, 0
+    for i, count in enumerate(histogram):
+        background += count
+        background_sum += i * count
+        foreground = total - background
+        if not background or not foreground:
+            continue
+        mean_b = background_sum / background
+        mean_f = (weighted - background_sum) / foreground
+        variance = background * foreground * (mean_b - mean_f) ** 2
+        if variance > best:
+            best, threshold = variance, i
+    return threshold
+
+
+def preprocess(image, band=CARD_NUMBER_BAND, max_width=MAX_OCR_WIDTH):
+    """
+    Prepares a card image for OCR: grayscale, crop to the number band,
+    downscale wide images, binarize (Otsu) to dark text on white, then trim
+    to the inked area and scale tiny text up to a size tesseract reads well.
+    """
+    from PIL import Image, ImageOps
+
+    image = image.convert("L")
+    if band:
+        top, bottom = int(image.height * band[0]), int(image.height * band[1])
+        image = image.crop((0, top, image.width, bottom))
+
+    if image.width > max_width:
+        ratio = max_width / image.width
+        image = image.resize(
+            (max_width, max(1, int(image.height * ratio))), Image.Resampling.LANCZOS
+        )
+
+    histogram = image.histogram()
+    threshold = _otsu_threshold(histogram)
+    dark_background = sum(histogram[: threshold + 1]) > image.width * image.height / 2
+    image = image.point(
+        lambda p: (0 if p > threshold else 255)
+        if dark_background
+        else (255 if p > threshold else 0)
+    )
+
+    bbox = ImageOps.invert(image).getbbox()
+    if bbox:
+        text_height = bbox[3] - bbox[1]
+        image = ImageOps.expand(image.crop(bbox), border=TEXT_PADDING, fill=255)
+        if text_height < MIN_TEXT_HEIGHT:
+            scale = -(-MIN_TEXT_HEIGHT // text_height)
+            image = image.resize(
+                (image.width * scale, image.height * scale), Image.Resampling.NEAREST
+            )
+    return image
+
+
+def _init_worker():
+    global _api, tesserocr
+    try:
+        import tesserocr
+    except ImportError:  # optional: keeps one engine loaded per worker
+        return
+    _api = tesserocr.PyTessBaseAPI()
+    _api.SetVariable("tessedit_char_whitelist", DIGITS)
+
+
+def _ocr(image, config):
+    if _api is not None:
+        single_line = "--psm 7" in config
+        _api.SetPageSegMode(
+            tesserocr.PSM.SINGLE_LINE if single_line else tesserocr.PSM.SINGLE_BLOCK
+        )
+        _api.SetImage(image)
+        return _api.GetUTF8Text()
+
+    import pytesseract
+
+    return pytesseract.image_to_string(image, config=config)
+
+
+def read_card_number(data: bytes):
+    """
+    OCRs the card number out of raw image bytes (runs inside a worker).
+
+    The number band is tried first; if it doesn't yield a plausible card
+    number (12+ digits), the whole preprocessed card is read instead.
+    Errors are raised as RuntimeError, since some (e.g. pytesseract's
+    TesseractNotFoundError) can't be pickled back to the parent and would
+    break the pool instead.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            text = _ocr(preprocess(image), LINE_CONFIG)
+            number = "".join(filter(str.isdigit, text))
+            if len(number) < 12:
+                text = _ocr(preprocess(image, band=None), BLOCK_CONFIG)
+                number = "".join(filter(str.isdigit, text))
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
+    return number
+
+
+class OCRPool:
+    """
+    Long-lived OCR worker processes with a content-hash result cache, held
+    in memory and, one small file per image, under `cache_dir`.
+    """
+
+    def __init__(
+        self, workers=OCR_WORKERS, cache_size=OCR_CACHE_SIZE, cache_dir=OCR_CACHE_DIR
+    ):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self._pool = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _executor(self, broken=None):
+        """The worker pool, replacing `broken` if it is still the current one."""
+        with self._lock:
+            if broken is not None and self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    mp_context=mp_context(),
+                )
+            return self._pool
+
+    def _disk_get(self, key: str):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, key), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, number: str):
+        if not self.cache_dir:
+            return
+        path = os.path.join(self.cache_dir, key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(number)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"OCR cache not written: {e}")
+
+    def read_numbers(self, paths: list):
+        """Returns the card number found in each image, in the same order."""
+        blobs = []
+        for path in paths:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+        keys = [hashlib.sha256(blob).hexdigest() for blob in blobs]
+
+        results = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[key] = self._cache[key]
+        todo = {}
+        for key, blob in zip(keys, blobs):
+            if key in results:
+                continue
+            number = self._disk_get(key)
+            if number is None:
+                todo[key] = blob
+            else:
+                results[key] = number
+
+        if todo:
+            with span("ocr"):
+                pool = self._executor()
+                try:
+                    numbers = list(pool.map(read_card_number, todo.values()))
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory): start over once.
+                    pool = self._executor(broken=pool)
+                    numbers = list(pool.map(read_card_number, todo.values()))
+            with self._lock:
+                for key, number in zip(todo, numbers):
+                    results[key] = number
+                    self._cache[key] = number
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            for key, number in zip(todo, numbers):
+                self._disk_put(key, number)
+
+        return [results[key] for key in keys]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+ocr_pool = OCRPool()
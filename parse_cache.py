@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from router import PATH_RE
+
+########## CONST ##########
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+PARSE_CACHE_DB = os.getenv(
+    "PARSE_CACHE_DB", os.path.join(DATA_DIR, ".cache", "parse-cache.db")
+)
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "1024"))
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+_EMAIL_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+_SLOT = "{{slot:%d}}"
+_SLOT_RE = re.compile(r"^\{\{slot:(\d+)\}\}$")
+# Bare file names such as "dates.txt"; the extension must start with a letter.
+_FILE_NAME_RE = re.compile(r"^[\w.\-]+\.[A-Za-z]\w{0,5}$")
+
+
+def normalize_task(task: str):
+    """
+    Normalizes a task description into a cache key.
+
+    File paths and email addresses are replaced by numbered slots before the
+    text is case- and whitespace-folded, so tasks that only differ in their
+    paths share one entry.
+
+    Returns:
+        tuple: (key, slots) where `slots` holds the abstracted values in order.
+    """
+    matches = sorted(
+        [(m.start(), m.group(0).rstrip(".,")) for m in PATH_RE.finditer(task)]
+        + [(m.start(), m.group(0)) for m in _EMAIL_RE.finditer(task)]
+    )
+    slots, parts, pos = [], [], 0
+    for start, value in matches:
+        if start < pos:
+            continue
+        if value not in slots:
+            slots.append(value)
+        parts.append(task[pos:start])
+        parts.append(_SLOT % slots.index(value))
+        pos = start + len(value)
+    parts.append(task[pos:])
+    text = "".join(parts)
+    return " ".join(text.casefold().split()), slots
+
+
+def _path_like(value: str):
+    """True for values that name a file, directory or address."""
+    return (
+        "/" in value
+        or "\\" in value
+        or "@" in value
+        or _FILE_NAME_RE.match(value) is not None
+    )
+
+
+def _strings(value):
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, str):
+        yield value
+
+
+def _to_template(value, slots: list):
+    """
+    Replaces slot values in a parse result with placeholders.
+
+    Returns None when any path-like value (including relative paths and bare
+    file names) isn't one of the slots, since the result would then be wrong
+    for other tasks sharing the key.
+    """
+    if isinstance(value, dict):
+        items = {key: _to_template(item, slots) for key, item in value.items()}
+        return None if None in items.values() else items
+    if isinstance(value, list):
+        items = [_to_template(item, slots) for item in value]
+        return None if None in items else items
+    if isinstance(value, str) and value in slots:
+        return _SLOT % slots.index(value)
+    if isinstance(value, str) and _path_like(value):
+        return None
+    return value
+
+
+def grounded(result, task: str):
+    """True if every path or address in a parse result appears in the task."""
+    return all(value in task for value in _strings(result) if _path_like(value))
+
+
+def _from_template(value, slots: list):
+    if isinstance(value, dict):
+        return {key: _from_template(item, slots) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_template(item, slots) for item in value]
+    match = _SLOT_RE.match(value) if isinstance(value, str) else None
+    return slots[int(match.group(1))] if match else value
+
+
+class ParseCache:
+    """Two-tier (in-memory LRU + SQLite) cache of parsed task descriptions."""
+
+    def __init__(
+        self, path=PARSE_CACHE_DB, capacity=PARSE_CACHE_SIZE, ttl=PARSE_CACHE_TTL
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._puts = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _db(self):
+        """Opens the SQLite tier on first use; returns None if it is unavailable."""
+        if self._conn is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS parse_cache (
+                        key TEXT PRIMARY KEY,
+                        action TEXT NOT NULL,
+                        params TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """
+                )
+                self._conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Parse cache running memory-only: {e}")
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get(self, task: str):
+        """Returns the cached `(action, params)` for a task, or None."""
+        key, slots = normalize_task(task)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1], _from_template(entry[2], slots)
+            self._memory.pop(key, None)
+
+            conn = self._db()
+            row = None
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT action, params, expires_at FROM parse_cache "
+                    "WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            action, template, expires_at = row[0], json.loads(row[1]), row[2]
+            self._remember(key, (expires_at, action, template))
+            self.counters["disk_hits"] += 1
+            return action, _from_template(template, slots)
+
+    def put(self, task: str, action: str, params: dict):
+        """Caches a parse result; results that can't be generalized are skipped."""
+        key, slots = normalize_task(task)
+        template = _to_template(params, slots)
+        if not action or template is None:
+            return
+
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, (expires_at, action, template))
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?)",
+                (key, action, json.dumps(template), expires_at),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                conn.execute(
+                    "DELETE FROM parse_cache WHERE expires_at <= ?", (time.time(),)
+                )
+            conn.commit()
+
+    def warm(self):
+        """
+        Loads the newest unexpired disk entries into the memory tier, up to
+        its capacity, then closes the connection. Run before forking server
+        workers so they start with a shared, populated cache.
+        """
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            rows = conn.execute(
+                "SELECT key, action, params, expires_at FROM parse_cache "
+                "WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), self.capacity),
+            ).fetchall()
+            for key, action, template, expires_at in reversed(rows):
+                self._remember(key, (expires_at, action, json.loads(template)))
+            conn.close()
+            self._conn = None
+            return len(rows)
+
+    def stats(self):
+        """Returns hit/miss counters and the size of each tier."""
+        with self._lock:
+            conn = self._db()
+            disk_size = (
+                conn.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+                if conn is not None
+                else 0
+            )
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_size": len(self._memory),
+                "memory_capacity": self.capacity,
+                "disk_size": disk_size,
+            }
+
+
+parse_cache = ParseCache()
@@ -1,139 +1,285 @@
+import asyncio
+import glob
 import subprocess
 import os
-from datetime import datetime
 import json
-import sqlite3
-
-import pytesseract
-from PIL import Image
-import openai
-import numpy as np
+import importlib
+import importlib.util
+import sys
+import time
+
+from dates import WEEKDAYS, weekday_histogram, weekday_index
+from emailparse import EMAIL_SUFFIXES, read_excerpt, sender_from_file
+from extsort import SORT_RUN_SIZE, external_sort
+from sales import ensure_type_index, sales_by_type, total_sales
+from mdindex import index_titles
+from logscan import read_first_line, recent_files
+from executor import run_cpu
+from memo import memoized
+from metrics import inc, record_usage, span, timed
 
 ########## CONST ##########
-DATA_DIR = "/data"
-
-
-def format_markdown(file_path: str):
-    """Formats a Markdown file using Prettier"""
-    full_path = os.path.join(DATA_DIR, file_path.lstrip("/"))
-    subprocess.run(["npx", "prettier", "--write", full_path], check=True)
-    return {"message": "Markdown formatted"}
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+# Heavy modules each action needs, imported on its first use (or by `preload`).
+ACTION_MODULES = {
+    "install_and_run": ("envcache",),
+    "format_markdown": ("formatter",),
+    "count_wednesdays": (),
+    "sort_contacts": (),
+    "extract_recent_logs": (),
+    "extract_markdown_titles": (),
+    "extract_email_sender": ("openai",),
+    "extract_credit_card": ("PIL.Image", "PIL.ImageOps"),
+    "find_similar_comments": ("numpy", "openai", "embeddings", "similarity"),
+    "calculate_sales": (),
+}
+
+
+def data_path(path: str):
+    """
+    Resolves a task path inside DATA_DIR, accepting "/data/x" as well as "x".
+    Tasks name their files under /data, so that prefix maps onto DATA_DIR
+    when it is set elsewhere.
+    """
+    if os.path.isabs(path) and os.path.commonpath([DATA_DIR, path]) == DATA_DIR:
+        return path
+    if path.startswith("/data/"):
+        path = path[len("/data/") :]
+    return os.path.join(DATA_DIR, path.lstrip("/"))
 
 
+def preload(actions):
+    """
+    Imports the modules behind the given actions ("all" for every action) so
+    their first request doesn't pay for it. Returns the modules imported.
+    """
+    if "all" in actions:
+        actions = list(ACTION_MODULES)
+    modules = []
+    for action in actions:
+        for name in ACTION_MODULES.get(action, ()):
+            importlib.import_module(name)
+            modules.append(name)
+    return modules
+
+
+def _run(cmd):
+    """Runs a command, counting its wall time; raises on a non-zero exit."""
+    start = time.perf_counter()
+    try:
+        with span("subprocess", cmd[0]):
+            subprocess.run(cmd, check=True)
+    finally:
+        inc("subprocess_seconds_total", time.perf_counter() - start, command=cmd[0])
+
+
+def _format_markdown(file_path):
+    from formatter import PRETTIER_VERSION, DaemonError, expand, format_files
+
+    paths = [file_path] if isinstance(file_path, str) else file_path
+    files = [data_path(path) for path in paths]
+    try:
+        report = format_files(files)
+    except DaemonError as e:
+        print(f"Prettier daemon unavailable, running npx: {e}")
+        _run(["npx", f"prettier@{PRETTIER_VERSION}", "--write", *expand(files)])
+        return {"message": "Markdown formatted"}
+
+    if report["errors"]:
+        failed = len(report["errors"])
+        return {"error": f"Prettier failed on {failed} file(s)", **report}
+    return {"message": "Markdown formatted", **report}
+
+
+@timed("execute", "format_markdown")
+def format_markdown(file_path):
+    """
+    Formats Markdown files (a path, a glob or a list of either) with a
+    long-lived Prettier process, skipping files unchanged since it last
+    formatted them
+    """
+    return _format_markdown(file_path)
+
+
+@timed("execute", "format_markdown")
+async def format_markdown_async(file_path):
+    """Async variant of `format_markdown`"""
+    return await asyncio.to_thread(_format_markdown, file_path)
+
+
+def _load_datagen(script: str):
+    """Imports a fresh copy of `datagen.py`, or returns None if it can't be."""
+    spec = importlib.util.spec_from_file_location("datagen", script)
+    if spec is None:
+        return None
+    # Left out of sys.modules: it runs with jobs=1, so nothing is pickled.
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        print(f"datagen.py can't run in-process: {e}")
+        return None
+    return module if hasattr(module, "generate") else None
+
+
+def _install_and_run(user_email: str, script="datagen.py"):
+    from envcache import ensure_environment
+
+    with span("install"):
+        env = ensure_environment("requirements.txt", run=_run)
+
+    # Just-installed packages may differ from ones this process already
+    # imported, so only an unchanged environment runs the script in-process.
+    # That runs its generators one after another: forking a process pool
+    # from a threaded server isn't safe.
+    datagen = None if env["installed"] else _load_datagen(script)
+    with span("datagen"):
+        if datagen is not None:
+            datagen.generate(user_email, root=DATA_DIR, jobs=1)
+        else:
+            _run([sys.executable, script, user_email])
+    return {
+        "message": "Data generation complete",
+        "environment": "installed" if env["installed"] else "cached",
+        "in_process": datagen is not None,
+    }
+
+
+@timed("execute", "install_and_run")
 def install_and_run_script(user_email: str):
-    """Installs `uv` if needed and runs `datagen.py`"""
-    subprocess.run(["pip", "install", "uv"], check=True)
-    subprocess.run(
-        ["python", "-m", "uv", "pip", "install", "-r", "requirements.txt"], check=True
-    )
-    subprocess.run(["python", "datagen.py", user_email], check=True)
-    return {"message": "Data generation complete"}
-
-
-def count_wednesdays(file_path: str, output_path: str):
-    """Counts the number of Wednesdays in a date file"""
-    full_path = os.path.join(DATA_DIR, file_path.lstrip("/"))
-    output_full_path = os.path.join(DATA_DIR, output_path.lstrip("/"))
+    """
+    Installs requirements.txt unless a matching environment is already in
+    place, then runs `datagen.py` (in-process when possible)
+    """
+    return _install_and_run(user_email)
 
-    with open(full_path, "r") as f:
-        dates = [
-            datetime.strptime(line.strip(), "%Y-%m-%d") for line in f if line.strip()
-        ]
 
-    wednesdays = sum(1 for date in dates if date.weekday() == 2)
+@timed("execute", "install_and_run")
+async def install_and_run_script_async(user_email: str):
+    """Async variant of `install_and_run_script`"""
+    return await asyncio.to_thread(_install_and_run, user_email)
 
-    with open(output_full_path, "w") as f:
-        f.write(str(wednesdays))
 
-    return {"message": f"Counted {wednesdays} Wednesdays"}
+@timed("execute", "count_wednesdays")
+@memoized(
+    "count_wednesdays",
+    inputs=("file_path",),
+    outputs=("output_path",),
+    resolve=data_path,
+)
+def count_wednesdays(file_path: str, output_path: str, weekday="wednesday"):
+    """Counts the number of Wednesdays (or any other weekday) in a date file"""
+    full_path = data_path(file_path)
+    output_full_path = data_path(output_path)
 
+    counts, unparsed = weekday_histogram(full_path)
+    index = weekday_index(weekday)
 
-def sort_contacts(file_path: str, output_path: str):
+    with open(output_full_path, "w") as f:
+        f.write(str(counts[index]))
+
+    message = f"Counted {counts[index]} {WEEKDAYS[index].capitalize()}s"
+    if unparsed:
+        message += f" ({unparsed} unparseable lines skipped)"
+    return {"message": message}
+
+
+@timed("execute", "sort_contacts")
+@memoized(
+    "sort_contacts",
+    inputs=("file_path",),
+    outputs=("output_path",),
+    resolve=data_path,
+)
+def sort_contacts(
+    file_path: str,
+    output_path: str,
+    keys=("last_name", "first_name"),
+    compact: bool = False,
+    run_size: int = SORT_RUN_SIZE,
+):
     """Sorts a JSON array of contacts by last_name, then first_name"""
-    full_path = os.path.join(DATA_DIR, file_path.lstrip("/"))
-    output_full_path = os.path.join(DATA_DIR, output_path.lstrip("/"))
-
-    with open(full_path, "r") as f:
-        contacts = json.load(f)
+    full_path = data_path(file_path)
+    output_full_path = data_path(output_path)
 
-    contacts.sort(key=lambda c: (c["last_name"], c["first_name"]))
-
-    with open(output_full_path, "w") as f:
-        json.dump(contacts, f, indent=2)
+    count = external_sort(
+        full_path, output_full_path, keys=keys, run_size=run_size, compact=compact
+    )
 
-    return {"message": "Contacts sorted"}
+    return {"message": f"Sorted {count} contacts"}
 
 
-def extract_recent_logs(directory: str, output_path: str):
-    """Extracts the first line of the 10 most recent log files"""
-    log_files = sorted(
-        [f for f in os.listdir(directory) if f.endswith(".log")],
-        key=lambda x: os.path.getmtime(os.path.join(directory, x)),
-        reverse=True,
-    )[:10]
+# Not memoized: which logs are recent depends on mtimes, and the log index
+# already avoids stat'ing every file again.
+@timed("execute", "extract_recent_logs")
+def extract_recent_logs(
+    directory: str, output_path: str, count: int = 10, use_index: bool = False
+):
+    """Extracts the first line of the `count` (default 10) most recent log files"""
+    directory = data_path(directory)
+    log_files = recent_files(directory, int(count), use_index=use_index)
 
-    first_lines = []
-    for file in log_files:
-        with open(os.path.join(directory, file), "r") as f:
-            first_lines.append(f.readline().strip())
+    first_lines = [read_first_line(os.path.join(directory, file)) for file in log_files]
 
-    with open(output_path, "w") as f:
+    with open(data_path(output_path), "w") as f:
         f.write("\n".join(first_lines))
 
     return {"message": "Recent logs extracted"}
 
 
+# Not memoized: the Markdown manifest already re-reads only changed files.
+@timed("execute", "extract_markdown_titles")
 def extract_markdown_titles(directory: str, output_path: str):
-    """Extracts H1 titles from Markdown files in a directory"""
-    index = {}
-
-    for file in os.listdir(directory):
-        if file.endswith(".md"):
-            with open(os.path.join(directory, file), "r") as f:
-                for line in f:
-                    if line.startswith("# "):
-                        index[file] = line[2:].strip()
-                        break  # Only first H1
-
-    with open(output_path, "w") as f:
-        json.dump(index, f, indent=2)
+    """Extracts H1 titles from Markdown files under a directory, by relative path"""
+    index, reread = index_titles(data_path(directory))
 
-    return {"message": "Markdown titles extracted"}
+    with open(data_path(output_path), "w") as f:
+        json.dump(index, f, indent=2)
 
+    return {"message": f"Markdown titles extracted ({reread} files re-read)"}
 
-def calculate_sales(db_file: str, output_path: str):
-    """Calculates the total sales for 'Gold' ticket type"""
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
 
-    cursor.execute("SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'")
-    total_sales = cursor.fetchone()[0] or 0
+@timed("execute", "calculate_sales")
+@memoized(
+    "calculate_sales",
+    inputs=("db_file",),
+    outputs=("output_path",),
+    resolve=data_path,
+)
+def calculate_sales(
+    db_file: str, output_path: str, ticket_type="Gold", create_index: bool = False
+):
+    """
+    Calculates the total sales for a ticket type ('Gold' by default).
 
-    with open(output_path, "w") as f:
-        f.write(str(total_sales))
+    With ticket_type=None the totals of every type are written as JSON.
+    """
+    db_file = data_path(db_file)
+    if create_index:
+        ensure_type_index(db_file)
 
-    conn.close()
-    return {"message": f"Total Gold ticket sales: {total_sales}"}
+    if ticket_type is None:
+        totals, elapsed = sales_by_type(db_file)
+        with open(data_path(output_path), "w") as f:
+            json.dump(totals, f, indent=2)
+        return {
+            "message": f"Total sales for {len(totals)} ticket types",
+            "query_ms": round(elapsed * 1000, 3),
+        }
 
+    total, elapsed = total_sales(db_file, ticket_type)
 
-import openai
+    with open(data_path(output_path), "w") as f:
+        f.write(str(total))
 
+    return {
+        "message": f"Total {ticket_type} ticket sales: {total}",
+        "query_ms": round(elapsed * 1000, 3),
+    }
 
-def extract_email_sender(input_file: str, output_file: str):
-    """
-    Reads an email from a file, extracts the sender’s email address using an LLM, and writes it to an output file.
 
-    Parameters:
-    - input_file (str): Path to the email text file.
-    - output_file (str): Path where the extracted email address will be saved.
-    """
-
-    # Read email content
-    with open(input_file, "r", encoding="utf-8") as f:
-        email_content = f.read()
-
-    # Prompt for the LLM
-    prompt = f"""
+# Prompt for the LLM, built once
+EMAIL_SENDER_PROMPT = """
     You are an expert in extracting email metadata. Given an email message, extract the sender’s email address.
 
     Email Message:
@@ -141,53 +287,139 @@ def extract_email_sender(input_file: str, output_file: str):
 
     Respond strictly with just the email address.
     """
+_EMAIL_HEAD, _EMAIL_TAIL = EMAIL_SENDER_PROMPT.split("{email_content}")
+EMAIL_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You extract sender email addresses from emails.",
+}
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": "You extract sender email addresses from emails.",
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0,
-    )
 
-    sender_email = response["choices"][0]["message"]["content"].strip()
+def _email_sender_messages(email_content: str):
+    """Builds the chat messages that ask the LLM for an email's sender."""
+    return [
+        EMAIL_SYSTEM_MESSAGE,
+        {"role": "user", "content": f"{_EMAIL_HEAD}{email_content}{_EMAIL_TAIL}"},
+    ]
+
+
+def expand_inputs(input_file, suffixes=None):
+    """
+    Turns a path, directory, glob pattern or list of paths into a list of files.
+
+    Directories are expanded to the files in them ending in one of `suffixes`.
+    """
+    if not isinstance(input_file, str):
+        return [data_path(path) for path in input_file]
+    if glob.has_magic(input_file):
+        return sorted(glob.glob(data_path(input_file)))
+
+    path = data_path(input_file)
+    if os.path.isdir(path) and suffixes:
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(suffixes)
+        )
+    return [path]
+
+
+@timed("execute", "extract_email_sender")
+def extract_email_sender(input_file, output_file: str):
+    """
+    Extracts the sender’s email address of one or more emails into an output file.
+
+    The From header is parsed locally; only emails whose headers can't be
+    parsed are sent (truncated) to the LLM.
+
+    Parameters:
+    - input_file (str | list): Path to the email text file, a directory of
+      .txt/.eml files, a glob pattern or a list of paths.
+    - output_file (str): Path where the extracted email address will be saved,
+      one per line for several emails.
+    """
+
+    from prompt import get_client
+
+    senders = []
+    for path in expand_inputs(input_file, EMAIL_SUFFIXES):
+        sender_email = sender_from_file(path)
+        if sender_email is None:
+            response = get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=_email_sender_messages(read_excerpt(path)),
+                temperature=0,
+            )
+            record_usage("chat", response)
+            sender_email = response.choices[0].message.content.strip()
+        senders.append(sender_email)
 
     # Write extracted email to output file
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(sender_email)
+    with open(data_path(output_file), "w", encoding="utf-8") as f:
+        f.write("\n".join(senders))
+
+    return senders[0] if len(senders) == 1 else senders
+
+
+@timed("execute", "extract_email_sender")
+async def extract_email_sender_async(input_file, output_file: str):
+    """Async variant of `extract_email_sender`; LLM fallbacks run concurrently."""
+    from prompt import get_async_client
+
+    paths = expand_inputs(input_file, EMAIL_SUFFIXES)
+    senders = [sender_from_file(path) for path in paths]
+
+    async def ask_llm(path):
+        response = await get_async_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_email_sender_messages(read_excerpt(path)),
+            temperature=0,
+        )
+        record_usage("chat", response)
+        return response.choices[0].message.content.strip()
+
+    missing = [i for i, sender in enumerate(senders) if sender is None]
+    answers = await asyncio.gather(*(ask_llm(paths[i]) for i in missing))
+    for i, answer in zip(missing, answers):
+        senders[i] = answer
 
-    return sender_email
+    with open(data_path(output_file), "w", encoding="utf-8") as f:
+        f.write("\n".join(senders))
 
+    return senders[0] if len(senders) == 1 else senders
 
-def extract_credit_card(input_file: str, output_file: str):
+
+@timed("execute", "extract_credit_card")
+def extract_credit_card(input_file, output_file: str):
     """
-    Reads a credit card number from an image file using OCR and saves it without spaces.
+    Reads credit card numbers from image files using OCR and saves them without spaces.
 
     Parameters:
-    - input_file (str): Path to the image containing the credit card number.
+    - input_file (str | list): Path to the image containing the credit card number,
+      a glob pattern, or a list of paths. Several images give one number per line.
     - output_file (str): Path where the extracted number will be saved.
     """
 
-    # Load the image
-    image = Image.open(input_file)
+    from ocr import ocr_pool
 
-    # Extract text using OCR
-    extracted_text = pytesseract.image_to_string(image)
+    paths = expand_inputs(input_file)
 
-    # Filter out digits only (removing spaces and other non-numeric characters)
-    credit_card_number = "".join(filter(str.isdigit, extracted_text))
+    # Preprocessed OCR on the warm worker pool, cached by image hash
+    numbers = ocr_pool.read_numbers(paths)
 
     # Write to output file
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(credit_card_number)
+    with open(data_path(output_file), "w", encoding="utf-8") as f:
+        f.write("\n".join(numbers))
 
-    return credit_card_number
+    return numbers[0] if len(numbers) == 1 else numbers
 
 
+@timed("execute", "find_similar_comments")
+@memoized(
+    "find_similar_comments",
+    inputs=("input_file",),
+    outputs=("output_file",),
+    resolve=data_path,
+)
 def find_similar_comments(input_file: str, output_file: str):
     """
     Finds the most similar pair of comments in a file using embeddings and writes them to an output file.
@@ -196,34 +428,65 @@ def find_similar_comments(input_file: str, output_file: str):
     - input_file (str): Path to the file containing comments (one per line).
     - output_file (str): Path where the most similar comments will be saved.
     """
+    from embeddings import embed_texts_sync
 
     # Read comments from file
-    with open(input_file, "r", encoding="utf-8") as f:
+    with open(data_path(input_file), "r", encoding="utf-8") as f:
         comments = [line.strip() for line in f.readlines() if line.strip()]
 
-    # Get embeddings for each comment
-    embeddings = []
-    for comment in comments:
-        response = openai.Embedding.create(
-            model="text-embedding-ada-002", input=comment
-        )
-        embeddings.append(np.array(response["data"][0]["embedding"]))
-
-    # Find the most similar pair
-    min_distance = float("inf")
-    most_similar_pair = ("", "")
+    # Get embeddings in batched requests, reusing cached vectors
+    embeddings = embed_texts_sync(comments)
 
-    for i in range(len(comments)):
-        for j in range(i + 1, len(comments)):
-            distance = np.linalg.norm(
-                embeddings[i] - embeddings[j]
-            )  # Euclidean distance
-            if distance < min_distance:
-                min_distance = distance
-                most_similar_pair = (comments[i], comments[j])
+    most_similar_pair = _most_similar_pair(comments, embeddings)
 
     # Write the most similar comments to output file
-    with open(output_file, "w", encoding="utf-8") as f:
+    with open(data_path(output_file), "w", encoding="utf-8") as f:
+        f.write(most_similar_pair[0] + "\n" + most_similar_pair[1])
+
+    return most_similar_pair
+
+
+def _most_similar_pair(comments: list, embeddings):
+    """Returns the pair of comments whose embeddings are closest."""
+    from similarity import (
+        SIMILARITY_EXACT_LIMIT,
+        approximate_top_pairs,
+        most_similar_pair,
+    )
+
+    if len(comments) > SIMILARITY_EXACT_LIMIT:
+        pairs = approximate_top_pairs(embeddings, k=1)
+        pair = pairs[0] if pairs else most_similar_pair(embeddings)
+    else:
+        pair = most_similar_pair(embeddings)
+
+    if pair is None:
+        return ("", "")
+    return (comments[pair[0]], comments[pair[1]])
+
+
+@timed("execute", "find_similar_comments")
+@memoized(
+    "find_similar_comments",
+    inputs=("input_file",),
+    outputs=("output_file",),
+    resolve=data_path,
+)
+async def find_similar_comments_async(input_file: str, output_file: str):
+    """
+    Async variant of `find_similar_comments`: embedding batches are requested
+    concurrently and the pair search runs in the process pool.
+    """
+    from embeddings import embed_texts
+
+    with open(data_path(input_file), "r", encoding="utf-8") as f:
+        comments = [line.strip() for line in f.readlines() if line.strip()]
+
+    embeddings = await embed_texts(comments)
+
+    most_similar_pair = await run_cpu(_most_similar_pair, comments, embeddings)
+
+    with open(data_path(output_file), "w", encoding="utf-8") as f:
         f.write(most_similar_pair[0] + "\n" + most_similar_pair[1])
 
     return most_similar_pair
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import re
+import time
+
+from memo import call_key, input_prints, lookup, record
+from phase_A import data_path
+from prompt import resolve_task_async
+from router import ROUTER_THRESHOLD, route_task
+
+########## CONST ##########
+# Parameters of each action naming the paths it reads and writes.
+ACTION_IO = {
+    "install_and_run": ((), ()),
+    "format_markdown": (("file",), ("file",)),
+    "count_wednesdays": (("file",), ("output",)),
+    "sort_contacts": (("file",), ("output",)),
+    "extract_recent_logs": (("dir",), ("output",)),
+    "extract_markdown_titles": (("dir",), ("output",)),
+    "extract_email_sender": (("file",), ("output",)),
+    "extract_credit_card": (("file",), ("output",)),
+    "find_similar_comments": (("file",), ("output",)),
+    "calculate_sales": (("db_file",), ("output",)),
+}
+# Actions that (re)write the whole data directory.
+WRITES_ALL_DATA = {"install_and_run"}
+# Actions never skipped as fresh: their own indexes already make reruns cheap,
+# while fingerprinting their input directories isn't.
+ALWAYS_RUN = {"extract_recent_logs", "extract_markdown_titles"}
+
+_STEP_SPLIT_RE = re.compile(
+    r"\s*(?:\n+\s*\d+[.)]\s+|\n+|;|,?\s*\band then\b|,?\s*\bthen\b|"
+    r",?\s*\bafter that\b|,?\s*\bfinally\b)\s*",
+    re.IGNORECASE,
+)
+
+
+def split_task(task: str):
+    """Splits a task description into candidate step descriptions."""
+    segments = [s.strip(" ,.") for s in _STEP_SPLIT_RE.split(task)]
+    return [s for s in segments if s]
+
+
+def local_plan(task: str, threshold: float = ROUTER_THRESHOLD):
+    """
+    Routes every step of a multi-step task locally.
+
+    A segment the router can't resolve on its own is glued to the next one,
+    so phrasings like "by last_name, then first_name" stay within one step,
+    but only when both segments score on the same action and the next one
+    isn't a complete step by itself. Anything else (e.g. "Delete X; sort Y")
+    is left to the LLM. Returns None unless every segment ends up in one of
+    two or more confidently routed steps.
+    """
+    steps, pending, pending_action = [], "", None
+    for segment in split_task(task):
+        action, params, confidence = route_task(segment)
+        if pending:
+            if action != pending_action or confidence >= threshold:
+                return None
+            action, params, confidence = route_task(f"{pending} then {segment}")
+            if action != pending_action:
+                return None
+            segment = f"{pending} then {segment}"
+        if action and confidence >= threshold:
+            steps.append((action, params))
+            pending, pending_action = "", None
+        else:
+            pending, pending_action = segment, action
+    if pending or len(steps) < 2:
+        return None
+    return steps
+
+
+async def parse_plan(task: str):
+    """
+    Parses a task into a list of (action, params) steps.
+
+    Returns:
+        tuple: (steps, source) where source is "router", "cache" or "llm".
+    """
+    steps = local_plan(task)
+    if steps:
+        return steps, "router"
+
+    action, params, source = await resolve_task_async(task)
+    if action == "plan":
+        return [(step["action"], step["params"]) for step in params["steps"]], source
+    return [(action, params)], source
+
+
+def step_paths(action: str, params: dict):
+    """Returns (inputs, outputs) of a step as absolute paths."""
+    input_keys, output_keys = ACTION_IO.get(action, ((), ()))
+    inputs = [data_path(params[key]) for key in input_keys if params.get(key)]
+    outputs = [data_path(params[key]) for key in output_keys if params.get(key)]
+    return inputs, outputs
+
+
+def _overlaps(a: str, b: str):
+    """True if one path is the other or contains it."""
+    return os.path.commonpath([a, b]) in (a, b)
+
+
+def build_dag(steps: list):
+    """
+    Returns the dependencies of each step as a list of sets of step indices.
+
+    A step depends on an earlier one when it reads what that step writes,
+    writes what it reads or writes, or the earlier step regenerates all data.
+    """
+    paths = [step_paths(action, params) for action, params in steps]
+    deps = []
+    for i, (action, _) in enumerate(steps):
+        inputs, outputs = paths[i]
+        touched = inputs + outputs
+        step_deps = set()
+        for j in range(i):
+            earlier_inputs, earlier_outputs = paths[j]
+            if steps[j][0] in WRITES_ALL_DATA or action in WRITES_ALL_DATA:
+                step_deps.add(j)
+            elif any(_overlaps(a, b) for a in touched for b in earlier_outputs):
+                step_deps.add(j)
+            elif any(_overlaps(a, b) for a in outputs for b in earlier_inputs):
+                step_deps.add(j)
+        deps.append(step_deps)
+    return deps
+
+
+def step_key(action: str, params: dict):
+    """Memo key of a plan step, covering its action and all of its params."""
+    return call_key(f"plan:{action}", params)
+
+
+def _skippable(action: str, params: dict):
+    """Steps with declared inputs and outputs that don't modify an input."""
+    if action in ALWAYS_RUN:
+        return False
+    inputs, outputs = step_paths(action, params)
+    return bool(inputs and outputs and not set(inputs) & set(outputs))
+
+
+def is_fresh(action: str, params: dict):
+    """
+    True if this step ran before with the same params, its inputs are
+    unchanged since and its outputs are as that run left them.
+
+    Steps that modify their input in place, have no declared outputs or are
+    in ALWAYS_RUN are never considered fresh.
+    """
+    if not _skippable(action, params):
+        return False
+    inputs, outputs = step_paths(action, params)
+    return lookup(step_key(action, params), inputs, outputs) is not None
+
+
+def step_prints(action: str, params: dict):
+    """Fingerprints of a skippable step's inputs, taken before it runs."""
+    if not _skippable(action, params):
+        return None
+    return input_prints(*step_paths(action, params))
+
+
+def record_step(action: str, params: dict, prints, result):
+    """Records a finished step for `is_fresh`, with its inputs as they were."""
+    if prints is not None:
+        _, outputs = step_paths(action, params)
+        record(step_key(action, params), f"plan:{action}", prints, outputs, result)
+
+
+async def run_plan(steps: list, execute, skip_fresh: bool = True):
+    """
+    Runs a plan, starting each step as soon as the steps it depends on finish.
+
+    Parameters:
+    - steps (list): (action, params) pairs.
+    - execute: Coroutine function `execute(action, params)` running one step.
+    - skip_fresh (bool): Skip steps that already ran with the same params on
+      the same inputs (see `is_fresh`), unless a step they depend on ran in
+      this plan.
+
+    Returns:
+    - list: One dict per step with its status, result and timing.
+    """
+    deps = build_dag(steps)
+    reports = [None] * len(steps)
+    done = [asyncio.Event() for _ in steps]
+
+    async def run_step(i):
+        action, params = steps[i]
+        for j in deps[i]:
+            await done[j].wait()
+        report = {
+            "step": i,
+            "action": action,
+            "params": params,
+            "after": sorted(deps[i]),
+        }
+        start = time.perf_counter()
+        try:
+            if any(reports[j]["status"] in ("failed", "blocked") for j in deps[i]):
+                report["status"] = "blocked"
+            elif (
+                skip_fresh
+                and all(reports[j]["status"] == "skipped" for j in deps[i])
+                and await asyncio.to_thread(is_fresh, action, params)
+            ):
+                report["status"] = "skipped"
+            else:
+                prints = await asyncio.to_thread(step_prints, action, params)
+                result = await execute(action, params)
+                report["result"] = result
+                report["status"] = "done"
+                if not (isinstance(result, dict) and "error" in result):
+                    await asyncio.to_thread(record_step, action, params, prints, result)
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = str(e)
+        report["seconds"] = round(time.perf_counter() - start, 6)
+        reports[i] = report
+        done[i].set()
+
+    await asyncio.gather(*(run_step(i) for i in range(len(steps))))
+    return reports
@@ -0,0 +1,57 @@
+// Long-lived Prettier formatter used by formatter.py.
+//
+// Reads one JSON request per line on stdin, {"id": 1, "files": ["/data/a.md"]},
+// formats the files in place and answers with one JSON line per request:
+// {"id": 1, "results": [{"file": "/data/a.md", "changed": true}]}, where a
+// file that failed has an "error" instead of "changed". Prettier is loaded
+// once and must be the version in PRETTIER_VERSION.
+
+const fs = require("fs/promises");
+const readline = require("readline");
+
+const prettier = require("prettier");
+
+const expected = process.env.PRETTIER_VERSION;
+if (expected && prettier.version !== expected) {
+  process.stderr.write(
+    `prettier ${prettier.version} found, ${expected} required\n`,
+  );
+  process.exit(2);
+}
+
+async function formatFile(file) {
+  try {
+    const info = await prettier.getFileInfo(file, { resolveConfig: true });
+    if (info.ignored || !info.inferredParser) {
+      return { file, changed: false, ignored: true };
+    }
+    const source = await fs.readFile(file, "utf8");
+    const options = (await prettier.resolveConfig(file)) || {};
+    const output = await prettier.format(source, { ...options, filepath: file });
+    if (output !== source) {
+      await fs.writeFile(file, output);
+    }
+    return { file, changed: output !== source };
+  } catch (error) {
+    return { file, error: String(error.message || error) };
+  }
+}
+
+const input = readline.createInterface({ input: process.stdin });
+
+input.on("line", async (line) => {
+  if (!line.trim()) return;
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (error) {
+    process.stdout.write(JSON.stringify({ id: null, error: "bad request" }) + "\n");
+    return;
+  }
+  const results = await Promise.all((request.files || []).map(formatFile));
+  process.stdout.write(JSON.stringify({ id: request.id, results }) + "\n");
+});
+
+input.on("close", () => process.exit(0));
+
+process.stdout.write(JSON.stringify({ ready: prettier.version }) + "\n");
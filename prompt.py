@@ -1,25 +1,25 @@
+import asyncio
 import os
 import json
-from openai import OpenAI
+from functools import lru_cache
 from dotenv import load_dotenv
 
+from router import route_task, ROUTER_THRESHOLD
+from parse_cache import grounded, parse_cache
+from batching import ParseBatcher
+from metrics import record_usage, timed
 
-def parse_task_with_llm(task: str):
-    """
-    Uses GPT-4o-Mini to analyze the task description and determine the action and parameters.
-
-    Returns:
-        dict: Parsed action and parameters.
-    """
-    load_dotenv()
-
-    api_key = os.getenv("AIPROXY_TOKEN")
-    if not api_key:
-        return {"error": "Missing API key. Set AIPROXY_TOKEN in the environment."}
-
-    client = OpenAI(api_key=api_key)
+# Parameter names used in the LLM schema, mapped to the ones `main.task_mapping` expects.
+PARAM_ALIASES = {
+    "input_file": "file",
+    "output_file": "output",
+    "log_dir": "dir",
+    "docs_dir": "dir",
+    "arg": "email",
+}
 
-    prompt = f"""
+# Built once at import; only the task text changes between requests.
+PARSE_PROMPT = """
     You are an intelligent task parser for an automation system. Given a task description in plain English, 
     extract the corresponding action and parameters.
 
@@ -40,6 +40,7 @@ def parse_task_with_llm(task: str):
     - "count_wednesdays":
       - "input_file" (str): Path to the file containing dates.
       - "output_file" (str): Path where the count should be saved.
+      - "weekday" (str): The day of the week to count, e.g. "Wednesday".
 
     - "sort_contacts":
       - "input_file" (str): Path to the contacts JSON file.
@@ -75,35 +76,261 @@ def parse_task_with_llm(task: str):
 
     Task: "{task}"
 
-    Respond strictly in JSON format.
+    Respond strictly in JSON format: {"action": "<action>", "parameters": {...}}
+    If the task asks for several actions in sequence, respond instead with
+    {"steps": [{"action": "<action>", "parameters": {...}}, ...]} in execution order.
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a precise and structured task parser.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-        )
+_PROMPT_HEAD, _PROMPT_TAIL = PARSE_PROMPT.split("{task}")
+# Batches of tasks reuse the action schema with a numbered list of tasks.
+_BATCH_HEAD = PARSE_PROMPT[: PARSE_PROMPT.index("    Extract the relevant details")]
+_BATCH_TAIL = """
+    Respond strictly in JSON format: {"results": [...]} with exactly one object
+    per task, in the same order, each either {"action": "<action>", "parameters": {...}}
+    or, for a task asking for several actions in sequence,
+    {"steps": [{"action": "<action>", "parameters": {...}}, ...]}.
+    """
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a precise and structured task parser.",
+}
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+# "openai" (default) or "local" for the FLAN-T5 parser in `llm.py`
+TASK_PARSER_BACKEND = os.getenv("TASK_PARSER_BACKEND", "openai")
+
 
-        # Corrected response parsing
+def build_prompt(task: str):
+    """Builds the chat messages that ask the LLM to parse a task."""
+    return [
+        SYSTEM_MESSAGE,
+        {"role": "user", "content": f"{_PROMPT_HEAD}{task}{_PROMPT_TAIL}"},
+    ]
+
+
+def build_batch_prompt(tasks: list):
+    """Builds the chat messages that ask the LLM to parse several tasks at once."""
+    numbered = "\n".join(
+        f"    {i}. {json.dumps(task)}" for i, task in enumerate(tasks, 1)
+    )
+    prompt = (
+        f"{_BATCH_HEAD}    Extract the relevant details from each of the following "
+        f"{len(tasks)} task descriptions independently:\n\n{numbered}\n{_BATCH_TAIL}"
+    )
+    return [SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
+
+
+def _parse_response(response):
+    """Extracts the JSON result from a chat completion."""
+    try:
+        record_usage("chat", response)
         result_content = response.choices[0].message.content.strip()
 
         # Ensure the response is valid JSON
-        parsed_result = json.loads(result_content)
-        return parsed_result
-
+        return json.loads(result_content)
     except json.JSONDecodeError:
         return {"error": "Failed to parse JSON response from OpenAI."}
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Returns the shared OpenAI client, or None without an API key."""
+    load_dotenv()
+    api_key = os.getenv("AIPROXY_TOKEN")
+    if not api_key:
+        return None
+
+    from openai import DefaultHttpxClient, OpenAI
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+    )
+    return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=limits))
+
+
+@lru_cache(maxsize=1)
+def get_async_client():
+    """
+    Returns the shared async OpenAI client, or None without an API key.
+
+    Its connection pool keeps up to LLM_MAX_CONNECTIONS connections alive,
+    so concurrent requests don't each pay for a TLS handshake.
+    """
+    load_dotenv()
+    api_key = os.getenv("AIPROXY_TOKEN")
+    if not api_key:
+        return None
+
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+    )
+    return AsyncOpenAI(
+        api_key=api_key, http_client=DefaultAsyncHttpxClient(limits=limits)
+    )
+
+
+@timed("llm_parse")
+def parse_task_with_llm(task: str):
+    """
+    Uses GPT-4o-Mini to analyze the task description and determine the action and parameters.
+
+    Returns:
+        dict: Parsed action and parameters.
+    """
+    if TASK_PARSER_BACKEND == "local":
+        from llm import local_parser
+
+        return local_parser.parse(task)
+
+    client = get_client()
+    if client is None:
+        return {"error": "Missing API key. Set AIPROXY_TOKEN in the environment."}
+
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4o-mini", messages=build_prompt(task), temperature=0
+        )
+        return _parse_response(response)
+    except Exception as e:
+        return {"error": f"An error occurred: {str(e)}"}
+
+
+@timed("llm_parse")
+async def parse_task_with_llm_async(task: str):
+    """Async variant of `parse_task_with_llm` using the shared async client."""
+    if TASK_PARSER_BACKEND == "local":
+        from llm import local_parser
+
+        return await local_parser.parse_async(task)
+
+    client = get_async_client()
+    if client is None:
+        return {"error": "Missing API key. Set AIPROXY_TOKEN in the environment."}
+
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o-mini", messages=build_prompt(task), temperature=0
+        )
+        return _parse_response(response)
     except Exception as e:
         return {"error": f"An error occurred: {str(e)}"}
 
 
+@timed("llm_parse_batch")
+async def parse_tasks_with_llm_async(tasks: list):
+    """
+    Parses several tasks with a single completion.
+
+    Returns one result per task, or None for tasks the response didn't
+    answer usably (the caller retries those one at a time). Answers are
+    matched to tasks by position, so one naming a path or address its task
+    doesn't mention (e.g. answers reordered by the model) is not used.
+    """
+    if TASK_PARSER_BACKEND == "local":
+        return await asyncio.gather(*(parse_task_with_llm_async(t) for t in tasks))
+
+    client = get_async_client()
+    if client is None:
+        error = {"error": "Missing API key. Set AIPROXY_TOKEN in the environment."}
+        return [error] * len(tasks)
+
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=build_batch_prompt(tasks),
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
+        results = _parse_response(response).get("results")
+    except Exception:
+        results = None
+
+    if not isinstance(results, list) or len(results) != len(tasks):
+        return [None] * len(tasks)
+    return [
+        result
+        if isinstance(result, dict)
+        and ("action" in result or "steps" in result)
+        and grounded(result, task)
+        else None
+        for task, result in zip(tasks, results)
+    ]
+
+
+parse_batcher = ParseBatcher(parse_task_with_llm_async, parse_tasks_with_llm_async)
+
+
+def _task_params(result: dict):
+    """
+    Converts a parsed LLM response into `(action, params)` for `main.task_mapping`.
+
+    Multi-step responses become `("plan", {"steps": [{"action", "params"}, ...]})`.
+    """
+    if "steps" in result:
+        steps = []
+        for step in result["steps"]:
+            action, params = _task_params(step)
+            steps.append({"action": action, "params": params})
+        return "plan", {"steps": steps}
+
+    action = result.get("action")
+    params = result.get("parameters") or result.get("params") or {
+        key: value for key, value in result.items() if key != "action"
+    }
+    return action, {PARAM_ALIASES.get(key, key): value for key, value in params.items()}
+
+
+def resolve_task(task: str, threshold: float = ROUTER_THRESHOLD):
+    """
+    Resolves a task to an action, trying the local router before the LLM.
+
+    Returns:
+        tuple: (action, params, source) where source is "router", "cache" or "llm".
+    """
+    action, params, confidence = route_task(task)
+    if action and confidence >= threshold:
+        return action, params, "router"
+
+    cached = parse_cache.get(task)
+    if cached:
+        return cached[0], cached[1], "cache"
+
+    result = parse_task_with_llm(task)
+    if "error" in result:
+        raise ValueError(result["error"])
+    action, params = _task_params(result)
+    parse_cache.put(task, action, params)
+    return action, params, "llm"
+
+
+async def resolve_task_async(task: str, threshold: float = ROUTER_THRESHOLD):
+    """
+    Async variant of `resolve_task` that awaits the LLM instead of blocking.
+
+    LLM parses go through `parse_batcher`, so a burst of requests is parsed
+    in a few batched calls rather than one call each.
+    """
+    action, params, confidence = route_task(task)
+    if action and confidence >= threshold:
+        return action, params, "router"
+
+    cached = await asyncio.to_thread(parse_cache.get, task)
+    if cached:
+        return cached[0], cached[1], "cache"
+
+    result = await parse_batcher.parse(task)
+    if "error" in result:
+        raise ValueError(result["error"])
+    action, params = _task_params(result)
+    await asyncio.to_thread(parse_cache.put, task, action, params)
+    return action, params, "llm"
+
+
 if __name__ == "__main__":
     task_description = "The file /data/dates.txt contains a list of dates, one per line. Count the number of Wednesdays in the list, and write just the number to /data/dates-wednesdays.txt"
     result = parse_task_with_llm(task_description)
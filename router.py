@@ -0,0 +1,244 @@
+import os
+import re
+
+########## CONST ##########
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.6"))
+
+# Weighted keyword patterns per action. A task scores the sum of the weights
+# of every pattern it matches; typical phrasings land around 1.0.
+ACTION_RULES = {
+    "install_and_run": [
+        (r"datagen", 0.6),
+        (r"\buv\b", 0.4),
+        (r"\binstall", 0.2),
+    ],
+    "format_markdown": [
+        (r"prettier", 0.6),
+        (r"\bformat", 0.4),
+        (r"\.md\b", 0.1),
+    ],
+    "count_wednesdays": [
+        (r"wednesday|monday|tuesday|thursday|friday|saturday|sunday", 0.6),
+        (r"\bdates?\b", 0.3),
+        (r"\bcount|\bhow many|\bnumber of", 0.2),
+    ],
+    "sort_contacts": [
+        (r"contacts?\b", 0.6),
+        (r"\bsort", 0.4),
+        (r"last_name|first_name|last name|first name", 0.2),
+    ],
+    "extract_recent_logs": [
+        (r"\.log\b|\blogs?\b", 0.5),
+        (r"\brecent|\bnewest|\blatest", 0.4),
+        (r"first line", 0.2),
+    ],
+    "extract_markdown_titles": [
+        (r"markdown|\.md\b", 0.3),
+        (r"\btitles?\b|\bh1\b|heading", 0.5),
+        (r"\bindex", 0.2),
+        (r"\bdocs?\b", 0.1),
+    ],
+    "extract_email_sender": [
+        (r"\bsender|\bfrom address|\bfrom:", 0.6),
+        (r"\bemail|e-mail", 0.3),
+        (r"email\.txt|\.eml\b", 0.2),
+    ],
+    "extract_credit_card": [
+        (r"credit[ _-]?card|card number", 0.7),
+        (r"\.png\b|\.jpe?g\b|\bimage", 0.3),
+    ],
+    "find_similar_comments": [
+        (r"\bsimilar", 0.6),
+        (r"\bcomments?\b", 0.3),
+        (r"embedding", 0.2),
+    ],
+    "calculate_sales": [
+        (r"\bsales\b", 0.5),
+        (r"\btickets?\b", 0.3),
+        (r"\.db\b|sqlite", 0.2),
+    ],
+}
+
+# Parameters each action needs in `main.task_mapping`.
+REQUIRED_PARAMS = {
+    "install_and_run": ("email",),
+    "format_markdown": ("file",),
+    "count_wednesdays": ("file", "output"),
+    "sort_contacts": ("file", "output"),
+    "extract_recent_logs": ("dir", "output"),
+    "extract_markdown_titles": ("dir", "output"),
+    "extract_email_sender": ("file", "output"),
+    "extract_credit_card": ("file", "output"),
+    "find_similar_comments": ("file", "output"),
+    "calculate_sales": ("db_file", "output"),
+}
+
+_COMPILED_RULES = {
+    action: [(re.compile(pattern), weight) for pattern, weight in rules]
+    for action, rules in ACTION_RULES.items()
+}
+
+# Absolute paths that are not part of a URL (`https://host/x` is skipped
+# because its slashes follow ':' / '/' or a word character).
+PATH_RE = re.compile(r"(?<![\w:/.])/[\w.\-]+(?:/[\w.\-*]*)*")
+_EMAIL_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+_WEEKDAY_RE = re.compile(
+    r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday)s?\b"
+)
+_COUNT_RE = re.compile(r"\b(\d+)\s+(?:most\s+)?(?:recent|newest|latest)")
+# Operations no action performs; a task asking for one goes to the LLM.
+_UNSUPPORTED_RE = re.compile(
+    r"\b(copy|copies|move|delete|remove|rename|convert|download|upload|fetch"
+    r"|compress|zip|unzip|send|email me|append)\b"
+)
+_SORT_KEY_RE = re.compile(r"\b(first[_ ]name|last[_ ]name|email)\b")
+_SORT_BY_RE = re.compile(r"\bby\s+(?:the\s+)?(\w+)")
+# A "by ..." clause, up to the next path or the end of the sentence.
+_SORT_CLAUSE_RE = re.compile(r"\bby\s+([^/.;]*)")
+# Qualifiers the actions' parameters can't express; such tasks go to the LLM.
+_DATE_FILTER_RE = re.compile(
+    r"\b(?:19|20)\d\d\b|\b(?:between|before|since|until|till|during)\b"
+    r"|\bafter\s+(?!that\b)|\b(?:this|last|past|next)\s+(?:\d+\s+)?(?:week|month|year)"
+    r"|\bin\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b"
+)
+_DESCENDING_RE = re.compile(
+    r"\b(?:desc|descending|reverse|reversed|decreasing)\b|\bz\s*(?:to|-)\s*a\b"
+)
+_SORT_KEY_WORDS = {"first", "last", "first_name", "last_name", "email"}
+DEFAULT_SORT_KEYS = ["last_name", "first_name"]
+_TICKET_RE = re.compile(
+    r"[\"'“](\w+)[\"'”]\s+tickets?|\b(gold|silver|bronze)\b", re.IGNORECASE
+)
+
+
+def extract_paths(task: str):
+    """Returns the absolute file-system paths mentioned in a task, in order."""
+    return [m.group(0).rstrip(".,") for m in PATH_RE.finditer(task)]
+
+
+def _score(text: str):
+    scores = {}
+    for action, rules in _COMPILED_RULES.items():
+        score = sum(weight for pattern, weight in rules if pattern.search(text))
+        if score:
+            scores[action] = score
+    return scores
+
+
+def extract_params(action: str, task: str):
+    """Pulls the `task_mapping` parameters for `action` out of the task text."""
+    params = {}
+    paths = extract_paths(task)
+    first = paths[0] if paths else None
+    # Prefer the last path that looks like a file as the output; directories
+    # mentioned afterwards (e.g. "without the /data/docs/ prefix") are noise.
+    candidates = [p for p in paths[1:] if os.path.splitext(p)[1]] or paths[1:]
+    last = candidates[-1] if candidates else None
+
+    if action == "install_and_run":
+        match = _EMAIL_RE.search(task)
+        if match:
+            params["email"] = match.group(0)
+    elif action == "format_markdown":
+        if first:
+            params["file"] = first
+    elif action in ("extract_recent_logs", "extract_markdown_titles"):
+        if first:
+            params["dir"] = first
+        if last:
+            params["output"] = last
+        match = _COUNT_RE.search(task.lower())
+        if action == "extract_recent_logs" and match:
+            params["count"] = int(match.group(1))
+    elif action == "count_wednesdays":
+        if first:
+            params["file"] = first
+        if last:
+            params["output"] = last
+        match = _WEEKDAY_RE.search(task.lower())
+        if match:
+            params["weekday"] = match.group(1)
+    elif action == "sort_contacts":
+        if first:
+            params["file"] = first
+        if last:
+            params["output"] = last
+        # Only the "by ..." clause names keys; fields listed elsewhere don't.
+        keys = []
+        for clause in _SORT_CLAUSE_RE.findall(task.lower()):
+            for match in _SORT_KEY_RE.finditer(clause):
+                key = match.group(1).replace(" ", "_")
+                if key not in keys:
+                    keys.append(key)
+        if keys and keys != DEFAULT_SORT_KEYS:
+            params["keys"] = keys
+    elif action == "calculate_sales":
+        db_files = [p for p in paths if p.endswith(".db")]
+        if db_files:
+            params["db_file"] = db_files[0]
+        outputs = [p for p in paths if p not in db_files]
+        if outputs:
+            params["output"] = outputs[-1]
+        match = _TICKET_RE.search(task)
+        if match:
+            params["ticket_type"] = (match.group(1) or match.group(2)).capitalize()
+    else:
+        if first:
+            params["file"] = first
+        if last:
+            params["output"] = last
+
+    return params
+
+
+def _unsupported(action: str, text: str):
+    """
+    True if the task asks for something `action` can't do as routed: an
+    operation no action performs, or a qualifier its parameters can't hold
+    (a date filter, a descending sort, an unknown sort key, several ticket
+    types).
+    """
+    text = PATH_RE.sub(" ", text)
+    if _UNSUPPORTED_RE.search(text):
+        return True
+    if action == "count_wednesdays":
+        return bool(_DATE_FILTER_RE.search(text))
+    if action == "sort_contacts":
+        return bool(_DESCENDING_RE.search(text)) or any(
+            word not in _SORT_KEY_WORDS for word in _SORT_BY_RE.findall(text)
+        )
+    if action == "calculate_sales":
+        types = {(a or b).lower() for a, b in _TICKET_RE.findall(text)}
+        return len(types) > 1
+    return False
+
+
+def route_task(task: str):
+    """
+    Classifies a task locally without calling the LLM.
+
+    Parameters:
+    - task (str): Plain-English task description.
+
+    Returns:
+    - tuple: (action, params, confidence). `action` is None when nothing matched;
+      `confidence` is 0 when the required parameters could not be extracted or
+      the task asks for something the action doesn't do (e.g. copying a file,
+      counting only dates in 2020, or sorting by an unknown key or descending).
+    """
+    scores = _score(task.lower())
+    if not scores:
+        return None, {}, 0.0
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    action, top = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+    params = extract_params(action, task)
+    if any(key not in params for key in REQUIRED_PARAMS[action]):
+        return action, params, 0.0
+    if _unsupported(action, task.lower()):
+        return action, params, 0.0
+
+    confidence = min(1.0, top) * (1.0 - runner_up / top)
+    return action, params, round(confidence, 3)
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+
+########## CONST ##########
+# Only set this when the database files are never written while being served.
+SALES_DB_IMMUTABLE = os.getenv("SALES_DB_IMMUTABLE", "0") == "1"
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _signature(db_file: str, immutable: bool):
+    """What must stay the same for a pooled connection to still be valid."""
+    st = os.stat(db_file)
+    if immutable:
+        # SQLite does no change detection at all on immutable databases.
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    # A read-only connection sees later writes, but not a replaced file.
+    return (st.st_ino,)
+
+
+def get_connection(db_file: str, immutable: bool = SALES_DB_IMMUTABLE):
+    """
+    Returns a pooled read-only connection to a database, and the lock guarding it.
+
+    Connections are opened with `mode=ro` (plus `immutable=1` if requested) and
+    reused until the file is replaced, or modified in the immutable case.
+    """
+    path = os.path.abspath(db_file)
+    signature = _signature(path, immutable)
+    key = (path, immutable)
+
+    with _pool_lock:
+        cached = _pool.get(key)
+        if cached and cached[0] == signature:
+            return cached[1], cached[2]
+        if cached:
+            cached[1].close()
+
+        uri = f"file:{path}?mode=ro" + ("&immutable=1" if immutable else "")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        _pool[key] = (signature, conn, threading.Lock())
+        return conn, _pool[key][2]
+
+
+def _query(db_file: str, sql: str, params=(), immutable=SALES_DB_IMMUTABLE):
+    """Runs a read query on the pooled connection; returns (rows, seconds)."""
+    conn, lock = get_connection(db_file, immutable)
+    start = time.perf_counter()
+    with lock:
+        rows = conn.execute(sql, params).fetchall()
+    return rows, time.perf_counter() - start
+
+
+def total_sales(db_file: str, ticket_type: str, immutable=SALES_DB_IMMUTABLE):
+    """
+    Returns (total of units * price for one ticket type, query seconds).
+
+    Totals are rounded to cents so the result doesn't depend on whether rows
+    were summed in table or index order.
+    """
+    rows, elapsed = _query(
+        db_file,
+        "SELECT ROUND(SUM(units * price), 2) FROM tickets WHERE type = ?",
+        (ticket_type,),
+        immutable,
+    )
+    return rows[0][0] or 0, elapsed
+
+
+def sales_by_type(db_file: str, immutable=SALES_DB_IMMUTABLE):
+    """Returns ({type: {"total", "tickets", "units"}}, query seconds) in one pass."""
+    rows, elapsed = _query(
+        db_file,
+        "SELECT type, ROUND(SUM(units * price), 2), COUNT(*), SUM(units) "
+        "FROM tickets GROUP BY type",
+        immutable=immutable,
+    )
+    return {
+        ticket_type: {"total": total, "tickets": tickets, "units": units}
+        for ticket_type, total, tickets, units in rows
+    }, elapsed
+
+
+def ensure_type_index(db_file: str):
+    """
+    Creates a covering index on tickets(type, units, price) if it is missing.
+
+    With it, per-type totals and the grouped aggregate read only the index
+    instead of scanning the table.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS tickets_type_units_price "
+            "ON tickets(type, units, price)"
+        )
+        conn.commit()
+    finally:
+        conn.close()
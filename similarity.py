@@ -0,0 +1,129 @@
+import heapq
+import os
+from collections import defaultdict
+
+import numpy as np
+
+########## CONST ##########
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", "2048"))
+# Above this many rows `find_similar_comments` switches to the LSH search.
+SIMILARITY_EXACT_LIMIT = int(os.getenv("SIMILARITY_EXACT_LIMIT", "50000"))
+
+
+def normalize_rows(embeddings):
+    """Returns a float32 copy of the embeddings with unit-length rows."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _blocks(n: int, block_size: int):
+    """Yields (row_start, row_end, col_start, col_end) covering the upper triangle."""
+    for i in range(0, n, block_size):
+        for j in range(i, n, block_size):
+            yield i, min(i + block_size, n), j, min(j + block_size, n)
+
+
+def _block_scores(unit, i0, i1, j0, j1):
+    """Cosine similarities of one block with the diagonal and below masked out."""
+    scores = unit[i0:i1] @ unit[j0:j1].T
+    if i0 == j0:
+        rows, cols = np.tril_indices(i1 - i0, m=j1 - j0)
+        scores[rows, cols] = -np.inf
+    return scores
+
+
+def most_similar_pair(embeddings, block_size: int = SIMILARITY_BLOCK_SIZE):
+    """
+    Finds the pair of rows with the highest cosine similarity.
+
+    Similarities are computed in (block_size x block_size) matrix multiplies,
+    so memory stays bounded regardless of the number of rows. For unit-length
+    embeddings (as returned by OpenAI) this is also the closest pair by
+    Euclidean distance.
+
+    Returns:
+    - tuple: (i, j, similarity) with i < j, or None for fewer than two rows.
+    """
+    unit = normalize_rows(embeddings)
+    if len(unit) < 2:
+        return None
+
+    best = (-np.inf, 0, 1)
+    for i0, i1, j0, j1 in _blocks(len(unit), block_size):
+        scores = _block_scores(unit, i0, i1, j0, j1)
+        r, c = np.unravel_index(np.argmax(scores), scores.shape)
+        if scores[r, c] > best[0]:
+            best = (float(scores[r, c]), i0 + int(r), j0 + int(c))
+    return best[1], best[2], best[0]
+
+
+def top_k_pairs(embeddings, k: int = 10, block_size: int = SIMILARITY_BLOCK_SIZE):
+    """
+    Finds the k most similar pairs of rows.
+
+    Returns:
+    - list: (i, j, similarity) tuples, most similar first.
+    """
+    unit = normalize_rows(embeddings)
+    heap = []  # min-heap of (similarity, i, j) holding the best k so far
+
+    for i0, i1, j0, j1 in _blocks(len(unit), block_size):
+        scores = _block_scores(unit, i0, i1, j0, j1).ravel()
+        take = min(k, scores.size)
+        for flat in np.argpartition(scores, -take)[-take:]:
+            score = scores[flat]
+            if score == -np.inf:
+                continue
+            r, c = divmod(int(flat), j1 - j0)
+            item = (float(score), i0 + r, j0 + c)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    return [(i, j, score) for score, i, j in sorted(heap, reverse=True)]
+
+
+def approximate_top_pairs(
+    embeddings,
+    k: int = 1,
+    planes: int = 16,
+    tables: int = 4,
+    seed: int = 0,
+    block_size: int = SIMILARITY_BLOCK_SIZE,
+):
+    """
+    Approximate top-k pairs using random-hyperplane LSH.
+
+    Rows are bucketed by the signs of their projections onto `planes` random
+    hyperplanes, repeated over `tables` independent tables; only rows that
+    share a bucket are compared exactly. Suited to 100k+ rows where the exact
+    search is too slow; very similar pairs are found with high probability.
+
+    Returns:
+    - list: (i, j, similarity) tuples, most similar first.
+    """
+    unit = normalize_rows(embeddings)
+    rng = np.random.default_rng(seed)
+    weights = 1 << np.arange(planes, dtype=np.int64)
+    candidates = {}
+
+    for _ in range(tables):
+        hyperplanes = rng.standard_normal((unit.shape[1], planes)).astype(np.float32)
+        signatures = ((unit @ hyperplanes) > 0).astype(np.int64) @ weights
+
+        buckets = defaultdict(list)
+        for row, signature in enumerate(signatures):
+            buckets[signature].append(row)
+
+        for rows in buckets.values():
+            if len(rows) < 2:
+                continue
+            rows = np.array(rows)
+            for i, j, score in top_k_pairs(unit[rows], k, block_size):
+                candidates[(int(rows[i]), int(rows[j]))] = score
+
+    best = heapq.nlargest(k, candidates.items(), key=lambda item: item[1])
+    return [(i, j, score) for (i, j), score in best]
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The app modules live at the top of the repo, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep caches and stores out of /data; set before any app module is imported.
+_cache = tempfile.mkdtemp(prefix="tests-cache-")
+os.environ.setdefault("MEMO_DB", os.path.join(_cache, "memo.db"))
+os.environ.setdefault("PARSE_CACHE_DB", os.path.join(_cache, "parse-cache.db"))
@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+from extsort import external_sort, iter_json_array
+
+DOCUMENT = """ [
+  {"last_name": "O'Neil", "first_name": "Ann", "note": "a, b ] c"},
+  3.25, -1e5, 1E+2, 0, 12345678901234567890, -0.5e-3,
+  "tail ]", [1, [2, 3]], {}, [], true, false, null ,
+  {"nested": {"x": [1.5, "y"]}}
+]
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 64, 1 << 16])
+def test_iter_json_array_matches_json_loads(chunk_size):
+    items = list(iter_json_array(io.StringIO(DOCUMENT), chunk_size=chunk_size))
+    assert items == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 16])
+@pytest.mark.parametrize("text", ["[]", " [ \n ] ", "[7]", "[\n1.0e1\n]"])
+def test_iter_json_array_small_arrays(text, chunk_size):
+    items = list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+    assert items == json.loads(text)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+@pytest.mark.parametrize(
+    "text", ["[1,,2]", "[,1]", "[1,]", "[1 2]", "[1", "[1,", "{}", ""]
+)
+def test_iter_json_array_rejects_malformed_input(text, chunk_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_external_sort_merges_spilled_runs(tmp_path):
+    contacts = [
+        {"last_name": last, "first_name": first}
+        for last, first in [("b", "x"), ("a", "z"), ("c", "a"), ("a", "y"), ("b", "a")]
+    ]
+    src, dst = tmp_path / "contacts.json", tmp_path / "sorted.json"
+    src.write_text(json.dumps(contacts))
+
+    count = external_sort(str(src), str(dst), run_size=2, tmp_dir=str(tmp_path))
+
+    assert count == len(contacts)
+    expected = sorted(contacts, key=lambda c: (c["last_name"], c["first_name"]))
+    assert json.loads(dst.read_text()) == expected
+    leftovers = sorted(path.name for path in tmp_path.iterdir())
+    assert leftovers == ["contacts.json", "sorted.json"]
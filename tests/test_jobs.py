@@ -0,0 +1,38 @@
+import pytest
+
+from jobs import JobStore, QueueFull
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), max_attempts=2, max_queued=2)
+
+
+def test_recover_requeues_then_fails_a_crashing_job(store):
+    job_id = store.submit("Count the Wednesdays")["job_id"]
+
+    # A claim owned by this process counts as orphaned, as after a crash.
+    store.claim()
+    assert store.recover() == 1
+    assert store.get(job_id)["status"] == "queued"
+
+    store.claim()
+    assert store.recover() == 0
+    job = store.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert "2 attempts" in job["error"]
+    assert store.claim() is None
+
+
+def test_submit_rejects_new_jobs_when_queue_is_full(store):
+    store.submit("task one")
+    store.submit("task two")
+    with pytest.raises(QueueFull):
+        store.submit("task three")
+
+    # Identical submissions still join their queued job.
+    assert store.submit("task one")["coalesced"]
+
+    store.claim()
+    assert not store.submit("task three")["coalesced"]
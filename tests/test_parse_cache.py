@@ -0,0 +1,38 @@
+import pytest
+
+from parse_cache import ParseCache, grounded
+
+TASK = "Format the file /data/format.md with prettier"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(str(tmp_path / "parse-cache.db"))
+
+
+def test_slotted_paths_are_reused_for_other_tasks(cache):
+    cache.put(TASK, "format_markdown", {"file": "/data/format.md"})
+    other = TASK.replace("format.md", "notes.md")
+    assert cache.get(other) == ("format_markdown", {"file": "/data/notes.md"})
+
+
+@pytest.mark.parametrize(
+    "value", ["data/format.md", "format.md", "./format.md", "data\\format.md"]
+)
+def test_unslotted_path_like_values_are_not_cached(cache, value):
+    cache.put(TASK, "format_markdown", {"file": value})
+    assert cache.get(TASK) is None
+    assert cache.stats()["disk_size"] == 0
+
+
+def test_plain_values_are_cached_literally(cache):
+    task = "Sort /data/contacts.json by last_name, first_name"
+    params = {"file": "/data/contacts.json", "keys": ["last_name", "3.5"]}
+    cache.put(task, "sort_contacts", params)
+    assert cache.get(task) == ("sort_contacts", params)
+
+
+def test_grounded_accepts_relative_paths_from_the_task():
+    task = "Count the lines in data/logs/app.log"
+    assert grounded({"action": "count", "file": "data/logs/app.log"}, task)
+    assert not grounded({"action": "count", "file": "data/other.log"}, task)
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import phase_A
+from phase_A import data_path
+from planner import local_plan, run_plan, split_task
+
+
+def test_split_task_on_separators():
+    task = (
+        "Count the Wednesdays in /data/dates.txt into /data/dates-wednesdays.txt; "
+        "sort /data/contacts.json into /data/contacts-sorted.json, then index "
+        "/data/docs into /data/docs/index.json and then finally stop"
+    )
+    assert split_task(task) == [
+        "Count the Wednesdays in /data/dates.txt into /data/dates-wednesdays.txt",
+        "sort /data/contacts.json into /data/contacts-sorted.json",
+        "index /data/docs into /data/docs/index.json",
+        "stop",
+    ]
+
+
+def test_split_task_on_numbered_lines():
+    task = "Do these:\n1. count the Wednesdays\n2) sort the contacts\n\nindex docs"
+    assert split_task(task) == [
+        "Do these:",
+        "count the Wednesdays",
+        "sort the contacts",
+        "index docs",
+    ]
+
+
+def test_local_plan_regenerate_sort_index():
+    steps = local_plan(
+        "Regenerate the data with datagen.py for user@example.com, then sort the "
+        "contacts in /data/contacts.json into /data/contacts-sorted.json, then "
+        "index the Markdown titles in /data/docs into /data/docs/index.json"
+    )
+    assert [action for action, _ in steps] == [
+        "install_and_run",
+        "sort_contacts",
+        "extract_markdown_titles",
+    ]
+    assert steps[0][1]["email"] == "user@example.com"
+    assert steps[1][1]["file"] == "/data/contacts.json"
+    assert steps[1][1]["output"] == "/data/contacts-sorted.json"
+    assert steps[2][1] == {"dir": "/data/docs", "output": "/data/docs/index.json"}
+
+
+def test_local_plan_glues_continuation_of_same_action():
+    steps = local_plan(
+        "Sort the contacts in /data/contacts.json by last_name, then first_name, "
+        "and write the result to /data/contacts-sorted.json, then count the "
+        "Wednesdays in /data/dates.txt into /data/dates-wednesdays.txt"
+    )
+    assert [action for action, _ in steps] == ["sort_contacts", "count_wednesdays"]
+    assert steps[0][1]["file"] == "/data/contacts.json"
+    assert steps[0][1]["output"] == "/data/contacts-sorted.json"
+
+
+def test_local_plan_keeps_unroutable_step_for_llm():
+    # Gluing "Download ..." onto the next step would silently drop it.
+    for verb in ("Download", "Archive"):
+        task = (
+            f"{verb} /data/x.txt, then count the Wednesdays in /data/dates.txt "
+            "and write the number to /data/dates-wednesdays.txt, then sort the "
+            "contacts in /data/contacts.json and write them to "
+            "/data/contacts-sorted.json"
+        )
+        assert local_plan(task) is None
+
+
+def test_local_plan_does_not_borrow_paths_from_unroutable_step():
+    for verb in ("Delete", "Erase"):
+        task = (
+            f"{verb} /data/contacts-sorted.json; sort /data/contacts.json by "
+            "last_name into /data/contacts-sorted.json; count the Wednesdays in "
+            "/data/dates.txt into /data/dates-wednesdays.txt"
+        )
+        assert local_plan(task) is None
+
+
+def test_local_plan_needs_two_steps():
+    assert (
+        local_plan(
+            "Count the Wednesdays in /data/dates.txt and write the number to "
+            "/data/dates-wednesdays.txt"
+        )
+        is None
+    )
+
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(phase_A, "DATA_DIR", str(tmp_path))
+    (tmp_path / "dates.txt").write_text("2024-01-03\n2024-01-04\n")
+    return tmp_path
+
+
+async def _write_weekday(action, params):
+    with open(data_path(params["output"]), "w") as f:
+        f.write(params.get("weekday", "wednesday"))
+    return {"message": "ok"}
+
+
+def _run(params):
+    return asyncio.run(run_plan([("count_wednesdays", params)], _write_weekday))
+
+
+def _params(**extra):
+    return {"file": "/data/dates.txt", "output": "/data/count.txt", **extra}
+
+
+def test_run_plan_skips_rerun_with_same_params(data_dir):
+    assert _run(_params(weekday="monday"))[0]["status"] == "done"
+    assert _run(_params(weekday="monday"))[0]["status"] == "skipped"
+
+
+def test_run_plan_reruns_step_with_changed_params(data_dir):
+    assert _run(_params(weekday="monday"))[0]["status"] == "done"
+    assert _run(_params(weekday="friday"))[0]["status"] == "done"
+    assert (data_dir / "count.txt").read_text() == "friday"
+    assert _run(_params(weekday="monday"))[0]["status"] == "done"
+
+
+def test_run_plan_reruns_step_after_input_changes(data_dir):
+    assert _run(_params())[0]["status"] == "done"
+    (data_dir / "dates.txt").write_text("2024-01-03\n2024-01-10\n")
+    assert _run(_params())[0]["status"] == "done"
+    assert _run(_params())[0]["status"] == "skipped"
+
+
+def test_run_plan_reruns_step_after_output_changes(data_dir):
+    assert _run(_params())[0]["status"] == "done"
+    (data_dir / "count.txt").write_text("edited")
+    assert _run(_params())[0]["status"] == "done"
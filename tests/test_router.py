@@ -0,0 +1,84 @@
+import pytest
+
+from router import ROUTER_THRESHOLD, extract_params, route_task
+
+
+@pytest.mark.parametrize(
+    "task, action, params",
+    [
+        (
+            "The file /data/dates.txt contains a list of dates. Count the "
+            "Wednesdays and write just the number to /data/dates-wednesdays.txt",
+            "count_wednesdays",
+            {
+                "file": "/data/dates.txt",
+                "output": "/data/dates-wednesdays.txt",
+                "weekday": "wednesday",
+            },
+        ),
+        (
+            "Sort the contacts in /data/contacts.json by last_name, then "
+            "first_name, and write the result to /data/contacts-sorted.json",
+            "sort_contacts",
+            {"file": "/data/contacts.json", "output": "/data/contacts-sorted.json"},
+        ),
+        (
+            "What is the total sales of all the items in the Gold ticket type in "
+            "/data/ticket-sales.db? Write the number to /data/ticket-sales-gold.txt",
+            "calculate_sales",
+            {
+                "db_file": "/data/ticket-sales.db",
+                "output": "/data/ticket-sales-gold.txt",
+                "ticket_type": "Gold",
+            },
+        ),
+    ],
+)
+def test_routes_plain_tasks(task, action, params):
+    routed, extracted, confidence = route_task(task)
+    assert routed == action
+    assert extracted == params
+    assert confidence >= ROUTER_THRESHOLD
+
+
+def test_sort_keys_come_from_the_by_clause():
+    task = (
+        "Each contact in /data/contacts.json has first_name, last_name and "
+        "email. Sort them by last_name then first_name into /data/sorted.json"
+    )
+    assert "keys" not in extract_params("sort_contacts", task)
+    task = "Sort /data/contacts.json by email, then last name into /data/out.json"
+    assert extract_params("sort_contacts", task)["keys"] == ["email", "last_name"]
+
+
+@pytest.mark.parametrize(
+    "task",
+    [
+        "Count the Wednesdays in /data/dates.txt that fall in 2020 and write the "
+        "number to /data/dates-wednesdays.txt",
+        "Count the Wednesdays between March and June in /data/dates.txt and "
+        "write the number to /data/dates-wednesdays.txt",
+        "Sort the contacts in /data/contacts.json by last name in descending "
+        "order and write them to /data/contacts-sorted.json",
+        "Sort the contacts in /data/contacts.json by last_name, Z to A, into "
+        "/data/contacts-sorted.json",
+        "What are the total sales of Silver and Gold tickets in "
+        "/data/ticket-sales.db? Write the number to /data/ticket-sales.txt",
+        "Copy /data/contacts.json sorted by last_name to /data/contacts-sorted.json",
+        "Sort the contacts in /data/contacts.json by phone number and write "
+        "them to /data/contacts-sorted.json",
+    ],
+)
+def test_unrepresentable_qualifiers_go_to_llm(task):
+    _, _, confidence = route_task(task)
+    assert confidence < ROUTER_THRESHOLD
+
+
+def test_years_in_paths_are_not_date_filters():
+    task = (
+        "Count the Wednesdays in /data/dates-2020.txt and write the number to "
+        "/data/wednesdays-2020.txt"
+    )
+    action, _, confidence = route_task(task)
+    assert action == "count_wednesdays"
+    assert confidence >= ROUTER_THRESHOLD